@@ -0,0 +1,164 @@
+# ~/projects/contenta/editor/analysis.py
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+word_pattern = re.compile(r"[A-Za-z][A-Za-z']*")
+sentence_pattern = re.compile(r"[.!?]+(?=\s|$)")
+vowel_groups = re.compile(r"[aeiouy]+")
+
+# A word used again within this many words counts as a repeat
+REPEAT_WINDOW = 20
+REPEAT_MIN_LENGTH = 4
+
+
+@dataclass(frozen=True)
+class TextMetrics:
+    """ Readability figures for one section body """
+    words: int
+    sentences: int
+    avg_sentence_length: float
+    reading_ease: float
+    """ Flesch reading ease: higher is easier, 60-70 is plain English """
+    repeated_words: tuple[str, ...]
+    repeated_spans: tuple[tuple[int, int], ...]
+    """ (start, end) of each close repeat, relative to the section body """
+
+    def summary(self) -> str:
+        text = (f"{self.words} words, {self.sentences} sentences\n"
+                f"Average sentence: {self.avg_sentence_length:.1f} words\n"
+                f"Reading ease: {self.reading_ease:.0f}")
+        if self.repeated_words:
+            text += f"\nRepeated: {', '.join(self.repeated_words[:8])}"
+        return text
+
+
+def _syllables(word: str) -> int:
+    count = len(vowel_groups.findall(word.lower()))
+    if word.lower().endswith("e") and count > 1:
+        count -= 1
+    return max(count, 1)
+
+
+def analyze_text(text: str) -> TextMetrics:
+    words = list(word_pattern.finditer(text))
+    sentences = max(len(sentence_pattern.findall(text)), 1 if words else 0)
+    syllables = sum(_syllables(match.group()) for match in words)
+
+    if words:
+        avg_sentence_length = len(words) / sentences
+        reading_ease = 206.835 - 1.015 * avg_sentence_length - 84.6 * (syllables / len(words))
+    else:
+        avg_sentence_length = 0.0
+        reading_ease = 0.0
+
+    last_seen: dict[str, int] = {}
+    repeated: dict[str, None] = {}
+    spans = []
+    for position, match in enumerate(words):
+        word = match.group().lower()
+        if len(word) < REPEAT_MIN_LENGTH: continue
+        previous = last_seen.get(word, None)
+        if previous is not None and position - previous <= REPEAT_WINDOW:
+            repeated[word] = None
+            spans.append(match.span())
+        last_seen[word] = position
+
+    return TextMetrics(len(words), sentences, avg_sentence_length, reading_ease,
+                       tuple(repeated), tuple(spans))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class AnalysisSignals(QObject):
+    finished = pyqtSignal(str, int, str, object)
+    """ element id, job generation, content hash, TextMetrics """
+
+
+class AnalysisJob(QRunnable):
+    def __init__(self, element_id: str, generation: int, text: str, digest: str):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.element_id = element_id
+        self.generation = generation
+        self.text = text
+        self.digest = digest
+        self.cancelled = False
+        self.signals = AnalysisSignals()
+
+    def run(self):
+        if self.cancelled: return
+        metrics = analyze_text(self.text)
+        if self.cancelled: return
+        self.signals.finished.emit(self.element_id, self.generation, self.digest, metrics)
+
+
+class AnalysisScheduler(QObject):
+    """ Runs per-section text analysis on a worker pool, visible sections first """
+
+    metrics_ready = pyqtSignal(str, object)
+    """ Emitted on the GUI thread with the element id and its TextMetrics """
+
+    visible_priority = 10
+    background_priority = 0
+
+    def __init__(self, parent: QObject | None = None, max_workers: int = 2, cache_size: int = 4096):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.cache: OrderedDict[str, TextMetrics] = OrderedDict()
+        self.cache_size = cache_size
+
+        self.generations: dict[str, int] = {}
+        self.pending: dict[str, AnalysisJob] = {}
+
+    def schedule(self, element_id: str, text: str, visible: bool = False) -> None:
+        """Queues analysis of a section, replacing any job still running for an older version of it."""
+        digest = content_hash(text)
+        metrics = self.cache.get(digest, None)
+        if metrics is not None:
+            self.cancel(element_id)
+            self.cache.move_to_end(digest)
+            self.metrics_ready.emit(element_id, metrics)
+            return
+
+        job = self.pending.get(element_id, None)
+        if job is not None and job.digest == digest: return
+        self.cancel(element_id)
+
+        generation = self.generations.get(element_id, 0) + 1
+        self.generations[element_id] = generation
+        job = AnalysisJob(element_id, generation, text, digest)
+        job.signals.finished.connect(self._job_finished)
+        self.pending[element_id] = job
+        self.pool.start(job, self.visible_priority if visible else self.background_priority)
+
+    def prioritize(self, element_ids: set[str]) -> None:
+        """Moves queued jobs for the given (visible) sections to the front of the queue."""
+        for element_id in element_ids:
+            job = self.pending.get(element_id, None)
+            if job is not None and self.pool.tryTake(job):
+                self.pool.start(job, self.visible_priority)
+
+    def cancel(self, element_id: str) -> None:
+        job = self.pending.pop(element_id, None)
+        if job is None: return
+        # Queued jobs are dropped; running ones finish but their result is ignored
+        job.cancelled = True
+        self.pool.tryTake(job)
+        self.generations[element_id] = self.generations.get(element_id, 0) + 1
+
+    def _job_finished(self, element_id: str, generation: int, digest: str, metrics: TextMetrics):
+        self.cache[digest] = metrics
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        if self.generations.get(element_id, None) != generation: return
+        self.pending.pop(element_id, None)
+        self.metrics_ready.emit(element_id, metrics)
@@ -0,0 +1,22 @@
+# ~/projects/contenta/editor/changes.py
+from dataclasses import dataclass
+from enum import Enum, auto
+from xml.etree.ElementTree import Element
+
+
+class ChangeKind(Enum):
+    INSERTED = auto()
+    REMOVED = auto()
+    MOVED = auto()
+    TEXT_CHANGED = auto()
+    ATTRIBUTE_CHANGED = auto()
+
+
+@dataclass(frozen=True)
+class ElementChange:
+    """ A single element-level change, delivered in batches by CSCRTree.elements_changed """
+    kind: ChangeKind
+    element_id: str
+    element: Element
+    parent: Element | None = None
+    attribute: str | None = None
@@ -1,11 +1,17 @@
 # ~/projects/contenta/editor/cscr.py
+import functools
 import time
+import weakref
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from typing import Self, Any, List, Dict
 from xml.etree.ElementTree import ElementTree, Element
 
 from PyQt6.QtCore import pyqtSignal, QObject
 
+from .changes import ChangeKind, ElementChange
+from .cscr_types import ElementFactory, clone_element, new_element_id
+
 
 version = 1.0
 startup_file = f"""
@@ -25,13 +31,98 @@ startup_file = f"""
 """
 
 
+def parse_cscr(source: str, from_string: bool = False) -> tuple[Element, list[str]]:
+    """Parses a script into typed, validated elements in a single pass.
+    Returns the root and a list of validation problems."""
+    factory = ElementFactory()
+    parser = ET.XMLParser(target=ET.TreeBuilder(element_factory=factory))
+    if from_string:
+        root = ET.fromstring(source, parser)
+    else:
+        root = ET.parse(source, parser).getroot()
+    return root, factory.errors
+
+
+@functools.cache
+def startup_prototype() -> tuple[Element, tuple[str, ...]]:
+    """The default document, parsed once; new documents are copied from it."""
+    root, errors = parse_cscr(startup_file, from_string=True)
+    return root, tuple(errors)
+
+
+class ReadableSpec:
+    """ Compiled form of an element's "readable" attribute """
+
+    _compiled: dict[str, "ReadableSpec"] = {}
+
+    def __init__(self, readable: str):
+        self.literal: str | None = None
+        self.show_tag = False
+        self.show_desc = False
+        self.show_body = False
+
+        # "readable" attribute doesn't start with "_"? Use the attribute itself as the only readable portion
+        if not readable.startswith("_"):
+            self.literal = f"{readable}\n"
+            return
+
+        # Parse the "readable" tag if it has instructions for what info is readable
+        text_sources: list[str] = readable[1:].split("_")
+        self.show_tag = "tag" in text_sources
+        self.show_desc = "desc" in text_sources
+        self.show_body = "body" in text_sources
+
+    @classmethod
+    def compile(cls, readable: str) -> "ReadableSpec":
+        """Returns the compiled spec for a "readable" value, compiling it only once."""
+        spec = cls._compiled.get(readable, None)
+        if spec is None:
+            spec = cls(readable)
+            cls._compiled[readable] = spec
+        return spec
+
+    def render(self, element: Element) -> (str, str):
+        if self.literal is not None: return "", self.literal
+
+        header_text: str = ""
+        body_text: str = ""
+        description = element.attrib.get("desc", "")
+        if self.show_tag and self.show_desc:
+            header_text = f"[{str(element.tag).capitalize()} - {description}]\n\n"
+        elif self.show_tag:
+            header_text = f"[{str(element.tag).capitalize()}]\n\n"
+        elif self.show_desc:
+            header_text = f"[{description}]\n\n"
+        if self.show_body:
+            body = element.text if element.text is not None else ""
+            body_text = f"{body}\n\n"
+        return header_text, body_text
+
+
 class CSCRTree(QObject):
 
     tree_updated = pyqtSignal(Element)
+    """ Emitted with the root element once per batch of changes """
+    elements_changed = pyqtSignal(list)
+    """ Emitted with the coalesced list[ElementChange] of a batch """
 
-    def __init__(self,parent: QObject | None = None, target_version: str = f"{version}"):
+    def __init__(self,parent: QObject | None = None, target_version: str = f"{version}", root: Element | None = None):
         super().__init__(parent)
-        self.root: Element = ET.fromstring(startup_file)
+        self.root: Element
+        self.validation_errors: list[str] = []
+        if root is None:
+            prototype, errors = startup_prototype()
+            root, self.validation_errors = clone_element(prototype), list(errors)
+        self.root = root
+        # Element lookup for get_element, maintained as elements are added and dropped
+        self._lookup: weakref.WeakValueDictionary[str, Element] = weakref.WeakValueDictionary()
+        # Parent of every indexed element, kept alongside _lookup so structural edits never search the tree
+        self._parents: weakref.WeakKeyDictionary[Element, Element] = weakref.WeakKeyDictionary()
+        self._transaction_depth = 0
+        self._pending: list[ElementChange] = []
+        # Bumped whenever an element changes through the tree; keys the rendered text memo
+        self._versions: weakref.WeakKeyDictionary[Element, int] = weakref.WeakKeyDictionary()
+        self._rendered: weakref.WeakKeyDictionary[Element, tuple[int, str, tuple[str, str]]] = weakref.WeakKeyDictionary()
         try:
             self.validate_version(target_version)
         except ValueError as e:
@@ -41,26 +132,24 @@ class CSCRTree(QObject):
         element_list = self._walk_tree(self.root)
         generated = {}
         for element in element_list:
-            generated[f"{hex(id(element))[2:]}"] = element
+            generated[self.element_key(element)] = element
 
         return generated
 
+    @staticmethod
+    def element_key(element: Element) -> str:
+        """Key an element is tracked by in index_tree and the editor views."""
+        return f"{hex(id(element))[2:]}"
+
     @classmethod
     def from_file(cls, filepath):
         """Parses a .cscr file and populates the class."""
-        instance = cls()
         try:
-            instance.root = ET.parse(filepath).getroot()
+            root, validation_errors = parse_cscr(filepath)
         except IOError:
             return
-
-        # Attach helpful element attributes
-        for line, child in enumerate(instance.root):
-            element_id = child.attrib.get("id", None)
-            if element_id is None:
-                child.attrib["id"] = child.tag + str(line)
-
-        # instance.generate_content()
+        instance = cls(root=root)
+        instance.validation_errors = validation_errors
 
         return instance
 
@@ -75,28 +164,128 @@ class CSCRTree(QObject):
         except IOError:
             pass
 
-    def add_element(self, tag: str, content: str = "",
-                    attributes: dict[str, str] | None = None,
-                    parent: Element | None = None) -> None:
-        """Adds or updates an element with data."""
+    @contextmanager
+    def transaction(self):
+        """Groups changes so they are delivered as one coalesced batch when the outermost transaction ends."""
+        self._transaction_depth += 1
+        try:
+            yield self
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._flush_changes()
+
+    def _record_change(self, kind: ChangeKind, element: Element,
+                       parent: Element | None = None, attribute: str | None = None) -> None:
+        self._pending.append(ElementChange(kind, self.element_key(element), element, parent, attribute))
+        if self._transaction_depth == 0:
+            self._flush_changes()
+
+    def _flush_changes(self) -> None:
+        if not self._pending: return
+        changes = self._coalesce(self._pending)
+        self._pending = []
+        if not changes: return
+        self.elements_changed.emit(changes)
+        self.tree_updated.emit(self.root)
+
+    @staticmethod
+    def _coalesce(changes: list[ElementChange]) -> list[ElementChange]:
+        """Drops repeated changes, and changes made redundant by an insert or removal in the same batch."""
+        inserted = {id(change.element) for change in changes if change.kind is ChangeKind.INSERTED}
+        removed = {id(change.element) for change in changes if change.kind is ChangeKind.REMOVED}
+        # Created and dropped within the batch: nobody needs to hear about it
+        transient = inserted & removed
+
+        # An element moved several times ends up under its last destination
+        last_moves = {id(change.element): change for change in changes if change.kind is ChangeKind.MOVED}
+
+        seen = set()
+        coalesced = []
+        for change in changes:
+            marker = id(change.element)
+            if marker in transient: continue
+            if change.kind not in (ChangeKind.INSERTED, ChangeKind.REMOVED) and (marker in inserted or marker in removed):
+                continue
+            key = (change.kind, marker, change.attribute)
+            if key in seen: continue
+            seen.add(key)
+            coalesced.append(last_moves[marker] if change.kind is ChangeKind.MOVED else change)
+        return coalesced
+
+    def create_element(self, tag: str, content: str = "",
+                       attributes: dict[str, str] | None = None,
+                       parent: Element | None = None, index: int | None = None) -> Element:
+        """Creates a new element with data and adds it to the tree."""
         if attributes is None:
             attributes = dict()
-        if parent is None:
-            parent = self.root
 
-        new_element = ET.SubElement(parent, tag, attributes)
+        new_element = Element(tag, attributes)
         new_element.text = content
-        for attribute, value in attributes.items():
-            new_element.attrib[attribute] = value
+        self.add_element(new_element, parent, index)
+        return new_element
 
-    def add_element(self, element: Element, parent: Element | None = None) -> None:
+    def add_element(self, element: Element, parent: Element | None = None, index: int | None = None) -> None:
         """Adds or updates an element with existing element."""
         if parent is None:
             parent = self.root
-        parent.append(element)
+        if index is None:
+            parent.append(element)
+        else:
+            parent.insert(index, element)
+
+        for child in self._walk_tree(element):
+            if child.get("id", None) is None:
+                child.set("id", new_element_id(str(child.tag)))
+        self._index_subtree(element, parent)
+        self._record_change(ChangeKind.INSERTED, element, parent)
 
     def drop_element(self, element_id: str):
-        pass
+        element = self.get_element(element_id)
+        if element is None: return
+        parent = self.get_parent(element)
+        if parent is None: return
+
+        parent.remove(element)
+        self._parents.pop(element, None)
+        for child in self._walk_tree(element):
+            self._lookup.pop(self.element_key(child), None)
+        self._record_change(ChangeKind.REMOVED, element, parent)
+
+    def move_element(self, element_id: str, parent: Element | None = None, index: int | None = None):
+        """Moves an element to a new parent and/or position."""
+        element = self.get_element(element_id)
+        if element is None: return
+        old_parent = self.get_parent(element)
+        if old_parent is None: return
+        if parent is None:
+            parent = self.root
+
+        old_parent.remove(element)
+        if index is None:
+            parent.append(element)
+        else:
+            parent.insert(index, element)
+        self._parents[element] = parent
+        self._record_change(ChangeKind.MOVED, element, parent)
+
+    def get_parent(self, element: Element) -> Element | None:
+        parent = self._parents.get(element, None)
+        if parent is None and element is not self.root:
+            # Never indexed: index the whole tree once
+            self._index_subtree(self.root, None)
+            parent = self._parents.get(element, None)
+        return parent
+
+    def _index_subtree(self, element: Element, parent: Element | None) -> None:
+        """Adds an element and everything under it to the id lookup and the parent map."""
+        stack = [(element, parent)]
+        while stack:
+            current, current_parent = stack.pop()
+            self._lookup[self.element_key(current)] = current
+            if current_parent is not None:
+                self._parents[current] = current_parent
+            stack.extend((child, current) for child in current)
 
     def get_tag_text(self, tag: str) -> str:
         for _, element in self.index_tree().items():
@@ -107,7 +296,12 @@ class CSCRTree(QObject):
 
     def get_element(self, element_id: str) -> Element | None:
         """Retrieves the content of a given tag."""
-        return self.index_tree().get(element_id, None)
+        element = self._lookup.get(element_id, None)
+        if element is None:
+            # Unknown key, or a document that was never indexed: index it once
+            self._index_subtree(self.root, None)
+            element = self._lookup.get(element_id, None)
+        return element
 
     def get_property(self, element_id: str, element_property: str) -> Any | None:
         element = self.get_element(element_id)
@@ -120,12 +314,21 @@ class CSCRTree(QObject):
     def set_property(self, element_id: str, element_property: str, data: str):
         element = self.get_element(element_id)
         if element is None: return
+        self.touch(element)
         if element_property == "content":
-            print(data)
             element.text = data
+            self._record_change(ChangeKind.TEXT_CHANGED, element)
             return
 
         element.attrib[element_property] = data
+        self._record_change(ChangeKind.ATTRIBUTE_CHANGED, element, attribute=element_property)
+
+    def touch(self, element: Element) -> None:
+        """Marks an element as changed, invalidating its rendered text."""
+        self._versions[element] = self._versions.get(element, 0) + 1
+
+    def element_version(self, element: Element) -> int:
+        return self._versions.get(element, 0)
 
     def _walk_tree(self, root: Element) -> List[Element]:
         yield root
@@ -133,33 +336,32 @@ class CSCRTree(QObject):
         for child in root:
             yield from self._walk_tree(child)
 
-    @ classmethod
-    def get_readable(cls, element: Element) -> (str, str):
-
+    def get_readable(self, element: Element) -> (str, str):
+        """Returns the (header, body) text of an element, memoized until the element changes."""
         # Is this content readable
         readable: str = element.attrib.get("readable", None)
         # No "readable" attribute? Skip entirely
         if readable is None: return None, None
 
-        header_text: str = ""
-        body_text: str = ""
-        # "readable" attribute doesn't start with "_"? Use the attribute itself as the only readable portion
-        if not readable.startswith("_"):
-            body_text = f"{readable}\n"
-        else:
-            # Parse the "readable" tag if it has instructions for what info is readable
-            text_sources: list[str] = readable[1:].split("_")
-            if "tag" in text_sources:
-                header_text = f"[{str(element.tag).capitalize()}]\n\n"
-            if "desc" in text_sources:
-                description = element.attrib.get("desc", "")
-                if len(header_text) > 0:
-                    header_text = f"{header_text.strip("]\n")} - {description}]\n\n"
-                else:
-                    header_text = f"[{description}]\n\n"
-            if "body" in text_sources:
-                body_text = f"{element.text}\n\n"
-        return header_text, body_text
+        version = self._versions.get(element, 0)
+        cached = self._rendered.get(element, None)
+        if cached is not None and cached[0] == version and cached[1] == readable:
+            return cached[2]
+
+        rendered = ReadableSpec.compile(readable).render(element)
+        self._rendered[element] = (version, readable, rendered)
+        return rendered
+
+    def rendered_texts(self) -> list[tuple[str, str]]:
+        """The (header, body) texts currently memoized by get_readable."""
+        return [rendered for _, _, rendered in self._rendered.values()]
+
+    @staticmethod
+    def render_readable(element: Element) -> (str, str):
+        """Renders the (header, body) text of an element without touching any memo."""
+        readable: str = element.attrib.get("readable", None)
+        if readable is None: return None, None
+        return ReadableSpec.compile(readable).render(element)
 
     def validate_version(self, required_version):
         """Ensures compatibility with the required version."""
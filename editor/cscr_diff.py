@@ -0,0 +1,349 @@
+# ~/projects/contenta/editor/cscr_diff.py
+import copy
+import hashlib
+import sys
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Collection, Iterable
+from xml.etree.ElementTree import Element, ElementTree
+
+from .changes import ChangeKind
+
+
+@dataclass(frozen=True)
+class EditOp:
+    """ One step of an element-level edit script from an old tree to a new one """
+    kind: ChangeKind
+    path: tuple[str, ...]
+    """ Keys of the ancestors of the element, from the root down """
+    key: str
+    index: int | None = None
+    """ Position in the new parent, for inserts and moves """
+    attribute: str | None = None
+    old: str | None = None
+    new: str | None = None
+    element: Element | None = None
+
+    def describe(self) -> str:
+        location = "/".join(self.path + (self.key,))
+        match self.kind:
+            case ChangeKind.INSERTED: return f"+ {location} at {self.index}"
+            case ChangeKind.REMOVED: return f"- {location}"
+            case ChangeKind.MOVED: return f"~ {location} to {self.index}"
+            case ChangeKind.TEXT_CHANGED: return f"* {location} text: {self.old!r} -> {self.new!r}"
+            case _: return f"* {location} @{self.attribute}: {self.old!r} -> {self.new!r}"
+
+
+class SubtreeHashes:
+    """ Hashes of every subtree, computed once bottom-up. Tails are formatting and are ignored.
+        Each subtree gets two: one over everything, used to spot edits, and one that skips ids,
+        used to match elements when only one side has ids. """
+
+    def __init__(self, root: Element):
+        self._hashes: dict[int, str] = {}
+        self._content: dict[int, str] = {}
+        # Keep the elements alive so id() stays unique while the hashes are in use
+        self._elements: list[Element] = []
+        self._hash(root)
+
+    def _hash(self, element: Element) -> tuple[str, str]:
+        digest = hashlib.sha1()
+        content = hashlib.sha1()
+        for target in (digest, content):
+            target.update(element.tag.encode())
+        for attribute, value in sorted(element.attrib.items()):
+            digest.update(f"\0{attribute}={value}".encode())
+            if attribute != "id":
+                content.update(f"\0{attribute}={value}".encode())
+        for target in (digest, content):
+            target.update(f"\1{element.text or ''}".encode())
+        for child in element:
+            child_digest, child_content = self._hash(child)
+            digest.update(f"\2{child_digest}".encode())
+            content.update(f"\2{child_content}".encode())
+
+        hexdigests = digest.hexdigest(), content.hexdigest()
+        self._hashes[id(element)], self._content[id(element)] = hexdigests
+        self._elements.append(element)
+        return hexdigests
+
+    def __getitem__(self, element: Element) -> str:
+        return self._hashes[id(element)]
+
+    def content(self, element: Element) -> str:
+        return self._content[id(element)]
+
+
+def shared_child_ids(parents: Iterable[Element], minimum: int) -> set[str]:
+    """Child ids found under at least minimum of the given parents."""
+    counts: dict[str, int] = {}
+    for parent in parents:
+        for element_id in {child.get("id") for child in parent if child.get("id", None) is not None}:
+            counts[element_id] = counts.get(element_id, 0) + 1
+    return {element_id for element_id, count in counts.items() if count >= minimum}
+
+
+def child_keys(parent: Element, hashes: SubtreeHashes, shared_ids: Collection[str]) -> dict[str, Element]:
+    """Keys children by their id where the other side has it too, falling back to their content hash.
+    Files saved before ids existed are then still matched against files that have them."""
+    keyed: dict[str, Element] = {}
+    occurrences: dict[str, int] = {}
+    for child in parent:
+        element_id = child.get("id", None)
+        if element_id is not None and element_id in shared_ids:
+            key = f"{child.tag}#{element_id}"
+        else:
+            digest = hashes.content(child)
+            count = occurrences.get(digest, 0)
+            occurrences[digest] = count + 1
+            key = f"{child.tag}@{digest[:12]}.{count}"
+        # A duplicated key is treated as a different element
+        while key in keyed:
+            key += "'"
+        keyed[key] = child
+    return keyed
+
+
+def _longest_increasing(sequence: list[int]) -> set[int]:
+    """Indices into sequence forming a longest strictly increasing subsequence (O(n log n))."""
+    tails: list[int] = []
+    tail_index: list[int] = []
+    previous: list[int] = [-1] * len(sequence)
+    for index, value in enumerate(sequence):
+        position = bisect_left(tails, value)
+        if position > 0:
+            previous[index] = tail_index[position - 1]
+        if position == len(tails):
+            tails.append(value)
+            tail_index.append(index)
+        else:
+            tails[position] = value
+            tail_index[position] = index
+
+    kept = set()
+    index = tail_index[-1] if tail_index else -1
+    while index != -1:
+        kept.add(index)
+        index = previous[index]
+    return kept
+
+
+def ordered_union(*keyed: Iterable[str]) -> list[str]:
+    """Keys of every argument, first seen first; unlike a set union the order is stable between runs."""
+    return list(dict.fromkeys(key for keys in keyed for key in keys))
+
+
+def diff_trees(old: Element, new: Element) -> list[EditOp]:
+    """Builds an element-level edit script turning old into new, in near-linear time."""
+    old_hashes = SubtreeHashes(old)
+    new_hashes = SubtreeHashes(new)
+    ops: list[EditOp] = []
+    _diff_element(old, new, (), old_hashes, new_hashes, ops)
+    return ops
+
+
+def _diff_element(old: Element, new: Element, path: tuple[str, ...],
+                  old_hashes: SubtreeHashes, new_hashes: SubtreeHashes, ops: list[EditOp]) -> None:
+    if old_hashes[old] == new_hashes[new]: return
+    key = path[-1] if path else old.tag
+    parent_path = path[:-1]
+
+    if (old.text or "") != (new.text or ""):
+        ops.append(EditOp(ChangeKind.TEXT_CHANGED, parent_path, key, old=old.text, new=new.text))
+    for attribute in ordered_union(old.attrib, new.attrib):
+        old_value, new_value = old.get(attribute, None), new.get(attribute, None)
+        if old_value != new_value:
+            ops.append(EditOp(ChangeKind.ATTRIBUTE_CHANGED, parent_path, key, attribute=attribute,
+                              old=old_value, new=new_value))
+
+    shared_ids = shared_child_ids((old, new), 2)
+    old_children = child_keys(old, old_hashes, shared_ids)
+    new_children = child_keys(new, new_hashes, shared_ids)
+    child_path = parent_path + (key,)
+
+    for child_key in [child_key for child_key in old_children if child_key not in new_children]:
+        ops.append(EditOp(ChangeKind.REMOVED, child_path, child_key, element=old_children[child_key]))
+
+    new_positions = {child_key: index for index, child_key in enumerate(new_children)}
+    for child_key, index in new_positions.items():
+        if child_key not in old_children:
+            ops.append(EditOp(ChangeKind.INSERTED, child_path, child_key, index=index,
+                              element=new_children[child_key]))
+
+    # Matched children keep their order if they lie on a longest increasing run of new positions
+    matched = [child_key for child_key in old_children if child_key in new_positions]
+    in_order = _longest_increasing([new_positions[child_key] for child_key in matched])
+    for order, child_key in enumerate(matched):
+        if order not in in_order:
+            ops.append(EditOp(ChangeKind.MOVED, child_path, child_key, index=new_positions[child_key]))
+        _diff_element(old_children[child_key], new_children[child_key], child_path + (child_key,),
+                      old_hashes, new_hashes, ops)
+
+
+def conflict_element(ours: Element | None, theirs: Element | None, reason: str) -> Element:
+    """Wraps both sides of a conflict in a <conflict> element, which shows up as a section in the editor."""
+    conflict = Element("conflict", {"desc": reason, "readable": "_tag_desc"})
+    ours_side = ET.SubElement(conflict, "ours")
+    if ours is not None:
+        ours_side.append(copy.deepcopy(ours))
+    theirs_side = ET.SubElement(conflict, "theirs")
+    if theirs is not None:
+        theirs_side.append(copy.deepcopy(theirs))
+    return conflict
+
+
+class ThreeWayMerge:
+    """ Merges two descendants of a common base tree, element by element """
+
+    def __init__(self, base: Element, ours: Element, theirs: Element):
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+        self.hashes = {side: SubtreeHashes(root) for side, root in
+                       (("base", base), ("ours", ours), ("theirs", theirs))}
+        self.conflicts = 0
+
+    def merge(self) -> Element:
+        merged = self._merge_element(self.base, self.ours, self.theirs)
+        if merged.tag == "conflict":
+            # Never replace the document root with a conflict; keep ours around it
+            root = copy.deepcopy(self.ours)
+            root[:] = [merged]
+            return root
+        return merged
+
+    def _conflict(self, ours: Element | None, theirs: Element | None, reason: str) -> Element:
+        self.conflicts += 1
+        return conflict_element(ours, theirs, reason)
+
+    def _merge_value(self, base: str | None, ours: str | None, theirs: str | None) -> tuple[str | None, bool]:
+        """Three-way merge of a single value; returns (value, conflicted)."""
+        if ours == theirs: return ours, False
+        if ours == base: return theirs, False
+        if theirs == base: return ours, False
+        return ours, True
+
+    def _merge_element(self, base: Element, ours: Element, theirs: Element) -> Element:
+        ours_hash, theirs_hash = self.hashes["ours"][ours], self.hashes["theirs"][theirs]
+        base_hash = self.hashes["base"][base]
+        # Untouched on one side: take the other side wholesale
+        if ours_hash == theirs_hash or theirs_hash == base_hash: return copy.deepcopy(ours)
+        if ours_hash == base_hash: return copy.deepcopy(theirs)
+
+        if ours.tag != theirs.tag:
+            return self._conflict(ours, theirs, "both changed")
+
+        merged = Element(ours.tag)
+        merged.text, conflicted = self._merge_value(base.text, ours.text, theirs.text)
+        if conflicted:
+            return self._conflict(ours, theirs, "both edited the text")
+        # Ours' attributes keep their order, so re-merging does not reshuffle the file
+        for attribute in ordered_union(ours.attrib, theirs.attrib, base.attrib):
+            value, conflicted = self._merge_value(base.get(attribute), ours.get(attribute), theirs.get(attribute))
+            # Ids given to the same element on both sides are not an edit anyone made; ours wins
+            if conflicted and attribute != "id":
+                return self._conflict(ours, theirs, f"both changed '{attribute}'")
+            if value is not None:
+                merged.set(attribute, value)
+        merged.tail = ours.tail
+
+        merged[:] = self._merge_children(base, ours, theirs)
+        return merged
+
+    def _merge_children(self, base: Element, ours: Element, theirs: Element) -> list[Element]:
+        shared_ids = shared_child_ids((base, ours, theirs), 2)
+        base_children = child_keys(base, self.hashes["base"], shared_ids)
+        ours_children = child_keys(ours, self.hashes["ours"], shared_ids)
+        theirs_children = child_keys(theirs, self.hashes["theirs"], shared_ids)
+
+        results: dict[str, Element] = {}
+        for key in ordered_union(ours_children, theirs_children):
+            base_child = base_children.get(key, None)
+            ours_child = ours_children.get(key, None)
+            theirs_child = theirs_children.get(key, None)
+
+            if ours_child is not None and theirs_child is not None:
+                if base_child is not None:
+                    results[key] = self._merge_element(base_child, ours_child, theirs_child)
+                elif self.hashes["ours"].content(ours_child) == self.hashes["theirs"].content(theirs_child):
+                    results[key] = copy.deepcopy(ours_child)
+                else:
+                    results[key] = self._conflict(ours_child, theirs_child, "both added")
+                continue
+
+            side, child, hashes = ("ours", ours_child, self.hashes["ours"]) if ours_child is not None \
+                else ("theirs", theirs_child, self.hashes["theirs"])
+            if base_child is None:
+                # Added on one side
+                results[key] = copy.deepcopy(child)
+            elif hashes.content(child) != self.hashes["base"].content(base_child):
+                # Edited on one side, deleted on the other (gaining an id is not an edit)
+                if side == "ours":
+                    results[key] = self._conflict(child, None, "edited here, deleted there")
+                else:
+                    results[key] = self._conflict(None, child, "deleted here, edited there")
+            # Untouched on one side and deleted on the other: stays deleted
+
+        # Follow theirs' order only if we left the order alone and they did not
+        base_order = [key for key in base_children if key in ours_children and key in theirs_children]
+        common = set(base_order)
+        ours_order = [key for key in ours_children if key in common]
+        theirs_order = [key for key in theirs_children if key in common]
+        if ours_order == base_order and theirs_order != base_order:
+            primary, secondary = list(theirs_children), list(ours_children)
+        else:
+            primary, secondary = list(ours_children), list(theirs_children)
+        return [results[key] for key in self._weave(primary, secondary, results)]
+
+    @staticmethod
+    def _weave(primary: list[str], secondary: list[str], kept: dict[str, Element]) -> list[str]:
+        """Orders kept keys as in primary, slotting secondary-only keys after their preceding sibling."""
+        placed = {key for key in primary if key in kept}
+        following: dict[str | None, list[str]] = {}
+        anchor = None
+        for key in secondary:
+            if key not in kept: continue
+            if key not in placed:
+                following.setdefault(anchor, []).append(key)
+            anchor = key
+
+        order: list[str] = []
+        for start in [None] + [key for key in primary if key in placed]:
+            # Depth-first, without recursion: insertion chains can be long
+            stack = [start]
+            while stack:
+                key = stack.pop()
+                if key is not None:
+                    order.append(key)
+                stack.extend(reversed(following.get(key, [])))
+        return order
+
+
+def merge_trees(base: Element, ours: Element, theirs: Element) -> tuple[Element, int]:
+    """Three-way merges two edited copies of base. Returns the merged root and the number of conflicts."""
+    merge = ThreeWayMerge(base, ours, theirs)
+    merged = merge.merge()
+    return merged, merge.conflicts
+
+
+def merge_files(base_path: str, ours_path: str, theirs_path: str, output_path: str | None = None) -> int:
+    """Merges three .cscr files into output_path (ours_path by default). Returns the number of conflicts."""
+    # Plain parse: only ids that were saved with the files are used to match elements
+    base, ours, theirs = (ET.parse(path).getroot() for path in (base_path, ours_path, theirs_path))
+    merged, conflicts = merge_trees(base, ours, theirs)
+    ElementTree(merged).write(output_path or ours_path, encoding="utf-8", xml_declaration=True)
+    return conflicts
+
+
+def merge_driver(base_path: str, ours_path: str, theirs_path: str) -> int:
+    """git merge driver: merges into ours_path, exit status 1 when conflicts were written."""
+    conflicts = merge_files(base_path, ours_path, theirs_path)
+    if conflicts:
+        print(f"contenta: {conflicts} conflict(s) in {ours_path}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def diff_files(old_path: str, new_path: str) -> list[EditOp]:
+    return diff_trees(ET.parse(old_path).getroot(), ET.parse(new_path).getroot())
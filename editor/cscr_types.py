@@ -1,29 +1,109 @@
-from typing import overload
+import re
+import uuid
+from typing import Callable
 from xml.etree.ElementTree import Element
 
 
+element_types: dict[str, type["CSCRElement"]] = {}
+""" Registry of element types by tag, used by ElementFactory while parsing """
+
+
+def register_element(cls: type["CSCRElement"]) -> type["CSCRElement"]:
+    """Class decorator adding an element type to the registry and compiling its schema."""
+    cls.compile_schema()
+    element_types[cls.tag_name] = cls
+    return cls
+
+
 class CSCRElement(Element):
+    tag_name: str = ""
+    schema: dict[str, Callable[[str], object] | None] = {}
+    """ Known attributes, mapped to a converter that raises ValueError on bad input (None: any string) """
+    required: tuple[str, ...] = ()
+
+    # Built by compile_schema: (attribute, converter, required), checked in one pass
+    _checks: tuple[tuple[str, Callable[[str], object] | None, bool], ...] = ()
+
     def __init__(self, tag: str, attributes: dict[str, str] | None = None):
         if attributes is None: attributes = dict()
         super().__init__(tag, attributes)
 
+    @classmethod
+    def compile_schema(cls) -> None:
+        cls._checks = tuple(
+            (attribute, converter, attribute in cls.required)
+            for attribute, converter in cls.schema.items()
+            if converter is not None or attribute in cls.required
+        )
+
+    @classmethod
+    def check_attributes(cls, attributes: dict[str, str]) -> list[str]:
+        """Returns a description of each attribute that does not fit the schema."""
+        problems = []
+        for attribute, converter, required in cls._checks:
+            value = attributes.get(attribute, None)
+            if value is None:
+                if required:
+                    problems.append(f"missing '{attribute}'")
+                continue
+            if converter is not None:
+                try:
+                    converter(value)
+                except ValueError:
+                    problems.append(f"invalid '{attribute}': {value!r}")
+        return problems
+
     @classmethod
     def validate(cls, data: dict[str, str]) -> Element | None:
         """For child classes to implement their own data validation"""
         return None
 
 
+@register_element
+class ScriptElement(CSCRElement):
+    tag_name = "cscr"
+    schema = {"version": float, "id": None}
+    required = ("version",)
+
+
+@register_element
+class TitleElement(CSCRElement):
+    tag_name = "title"
+
+
+@register_element
+class TransitionElement(CSCRElement):
+    tag_name = "transition"
+    schema = {"desc": None, "readable": None}
+
+
+@register_element
+class MonologueElement(CSCRElement):
+    tag_name = "monologue"
+    schema = {"desc": None, "readable": None}
+
+
+@register_element
 class ClipElement(CSCRElement):
-    def __init__(self):
-        super().__init__("clip")
+    tag_name = "clip"
+    schema = {"start": int, "end": int, "ref": None}
+    required = ("start", "end")
+
+    def __init__(self, tag: str = "clip", attributes: dict[str, str] | None = None):
+        super().__init__(tag, attributes)
+
+    @classmethod
+    def check_attributes(cls, attributes: dict[str, str]) -> list[str]:
+        problems = super().check_attributes(attributes)
+        if not problems and int(attributes["end"]) < int(attributes["start"]):
+            problems.append("'end' is before 'start'")
+        return problems
 
     @classmethod
     def validate(cls, data: dict[str, str]) -> Element | None:
         # Title of the clip goes in between the tags
         title = data.pop("title", "untitled clip")
-        start = data.get("start", None)
-        end = data.get("end", None)
-        if start is None or end is None:
+        if cls.check_attributes(data):
             return None
 
         new_element = cls()
@@ -32,3 +112,66 @@ class ClipElement(CSCRElement):
         new_element.attrib.update(data)
 
         return new_element
+
+
+class ElementFactory:
+    """ TreeBuilder element factory: builds typed, validated elements in the parse pass.
+        Saved ids are kept as they are; elements saved without one only get an id when added
+        through CSCRTree, so saving an untouched file adds no attributes to it. """
+
+    def __init__(self):
+        self.errors: list[str] = []
+        self._seen_ids: set[str] = set()
+        self._tag_counts: dict[str, int] = {}
+
+    def __call__(self, tag: str, attributes: dict[str, str]) -> Element:
+        element_type = element_types.get(tag, CSCRElement)
+        attributes = dict(attributes)
+        count = self._tag_counts.get(tag, 0) + 1
+        self._tag_counts[tag] = count
+
+        element_id = attributes.get("id", None)
+        if element_id is not None and element_id in self._seen_ids:
+            self.errors.append(f"{element_id}: duplicate id, removed")
+            del attributes["id"]
+            element_id = None
+        if element_id is not None:
+            self._seen_ids.add(element_id)
+
+        # Elements without an id are named by position in messages only
+        label = element_id if element_id is not None else f"{tag} #{count}"
+        self.errors.extend(f"{label}: {problem}" for problem in element_type.check_attributes(attributes))
+        return element_type(tag, attributes)
+
+
+param_pattern = re.compile(r"\$\{(\w+)\}")
+""" ${name} placeholders in template text and attribute values """
+
+
+generated_id_pattern = re.compile(r"^.+-[0-9a-f]{8}$")
+""" Ids made by new_element_id; any other id was written by hand and may be looked up by name """
+
+
+def new_element_id(tag: str) -> str:
+    # Random ids stay unique when several writers add elements in parallel
+    return f"{tag}-{uuid.uuid4().hex[:8]}"
+
+
+def clone_element(prototype: Element, params: dict[str, str] | None = None) -> Element:
+    """Structural copy of an already-parsed tree, keeping each element's type and explicit ids; generated ids are renewed.
+    ${name} placeholders found in params are substituted; unknown ones are left in place."""
+    def substitute(value: str | None) -> str | None:
+        if not params or value is None or "${" not in value: return value
+        return param_pattern.sub(lambda match: params.get(match.group(1), match.group(0)), value)
+
+    def copy(source: Element) -> Element:
+        attributes = {key: substitute(value) for key, value in source.attrib.items()}
+        if generated_id_pattern.match(attributes.get("id", "")):
+            attributes["id"] = new_element_id(source.tag)
+        element = type(source)(source.tag, attributes)
+        element.text = substitute(source.text)
+        element.tail = source.tail
+        element.extend(copy(child) for child in source)
+        return element
+
+    return copy(prototype)
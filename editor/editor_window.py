@@ -1,25 +1,36 @@
 # ~/projects/contenta/editor/editor_window.py
+import os
 from xml.etree.ElementTree import Element
 
 from PyQt6.QtWidgets import (
-    QMainWindow, QSplitter, QFileDialog, QMessageBox, QInputDialog
+    QMainWindow, QSplitter, QFileDialog, QMessageBox, QInputDialog, QWidget, QHBoxLayout
 )
+from PyQt6.QtGui import QKeySequence, QShortcut
 
 from PyQt6.QtCore import (
-    Qt
+    Qt, QTimer, QThreadPool, pyqtSignal
 )
 
-from .cscr import CSCRTree
-from .cscr_types import (
-    ClipElement
-)
+from .cscr import CSCRTree, ChangeKind, ElementChange
 from .text_area import TextArea
 from .outline_pane import OutlinePane
+from .paste import SectionSplitter
+from .analysis import AnalysisScheduler
+from .minimap import Minimap
+from .teleprompter import Teleprompter
+from .links import ClipLinkIndex, ClipLink
+from .session import SessionStore, SessionLoader, RestoredFile, FileSnapshot, file_fingerprint
+from .find_replace import shutdown_pool
 
 from ui.menus import FileMenu
 
 
 class EditorWindow(QMainWindow):
+    first_painted = pyqtSignal()
+    """ Emitted once, when the window has painted for the first time """
+    startup_finished = pyqtSignal()
+    """ Emitted once the startup document has been rendered """
+
     def __init__(self):
         super().__init__()
 
@@ -37,28 +48,130 @@ class EditorWindow(QMainWindow):
 
         # Create a plain text editor
         self.text_editor = TextArea()
-        self.text_editor.script_updated.connect(lambda ele_id, ele_text: self.cscr_file.set_property(ele_id, "content", ele_text))
+        self.text_editor.script_updated.connect(self.on_script_updated)
         self.text_editor.header_selected.connect(lambda ele_id: print(ele_id))
+        self.text_editor.large_paste.connect(self.on_large_paste)
+        self.text_editor.section_entered.connect(self.on_section_entered)
+
+        # Minimap alongside the editor
+        self.minimap = Minimap(self.text_editor)
+        self.minimap.element_clicked.connect(lambda element_id: self.text_editor.seek_to_element(element_id))
+        self.text_editor.script_updated.connect(lambda ele_id, ele_text: self.minimap.invalidate([ele_id]))
+        editor_pane = QWidget()
+        editor_layout = QHBoxLayout(editor_pane)
+        editor_layout.setContentsMargins(0, 0, 0, 0)
+        editor_layout.setSpacing(0)
+        editor_layout.addWidget(self.text_editor)
+        editor_layout.addWidget(self.minimap)
 
         # Add the text editor to the layout
         central_widget.setSizes({1, 3})
-        central_widget.addWidget(self.text_editor)
+        central_widget.addWidget(editor_pane)
+
+        # Text analysis runs in the background and comes back as decorations
+        self.analysis = AnalysisScheduler(self)
+        self.analysis.metrics_ready.connect(self.text_editor.set_section_metrics)
+        self.analysis.metrics_ready.connect(self.tree_view.set_section_metrics)
+        self.analysis_timer = QTimer(self)
+        self.analysis_timer.setSingleShot(True)
+        self.analysis_timer.setInterval(150)
+        self.analysis_timer.timeout.connect(lambda: self.analysis.prioritize(self.text_editor.visible_sections()))
+        self.text_editor.verticalScrollBar().valueChanged.connect(self.analysis_timer.start)
+
+        # Timed read-through; the outline jumps it to any section
+        self.teleprompter = Teleprompter(self.text_editor, self)
+        self.teleprompter.section_changed.connect(self.tree_view.select_element)
+        self.tree_view.element_selected.connect(self.on_outline_selected)
+        # Space pauses and resumes; only bound while reading, so it types normally otherwise
+        self.pause_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Space), self)
+        self.pause_shortcut.setEnabled(False)
+        self.pause_shortcut.activated.connect(self.teleprompter.toggle_pause)
 
         # Add a menu bar
         menu_bar = FileMenu(self)
         menu_bar.get_action("New").triggered.connect(self.new_file)
+        menu_bar.get_action("New from Template...").triggered.connect(self.new_from_template)
         menu_bar.get_action("Load").triggered.connect(self.load_file)
         menu_bar.get_action("Save").triggered.connect(self.save_file)
+        menu_bar.get_action("Export...").triggered.connect(self.export_file)
         menu_bar.get_action("Change Title").triggered.connect(self.set_title_dialog)
+        find_action = menu_bar.get_action("Find and Replace...")
+        find_action.setShortcut(QKeySequence.StandardKey.Replace)
+        find_action.triggered.connect(self.open_find_replace)
+        menu_bar.get_action("Manage Media/References").triggered.connect(self.open_media_manager)
+        split_action = menu_bar.get_action("Split Large Pastes")
+        split_action.setCheckable(True)
+        split_action.setChecked(True)
+        self.split_large_pastes = True
+        split_action.toggled.connect(lambda checked: setattr(self, "split_large_pastes", checked))
+        menu_bar.get_action("Memory Report...").triggered.connect(self.open_memory_report)
+        read_action = menu_bar.get_action("Read-Through")
+        read_action.setCheckable(True)
+        read_action.setShortcut(QKeySequence(Qt.Key.Key_F5))
+        read_action.toggled.connect(self.toggle_read_through)
+        self.teleprompter.finished.connect(lambda: read_action.setChecked(False))
+        self.read_action = read_action
+        # Actions that need a document; finish_startup enables them once there is one
+        self.document_actions = [menu_bar.get_action(text) for text in
+                                 ("Save", "Export...", "Change Title", "Find and Replace...", "Read-Through")]
+        for action in self.document_actions:
+            action.setEnabled(False)
         self.setMenuBar(menu_bar)
         self.update_title_bar()
 
         self.cscr_file: CSCRTree | None = None
         self.active_filename: str | None = None
-        self.new_file()
+        # (mtime, size, sha256) of the active file when it was last loaded or saved
+        self.active_fingerprint: tuple[float, int, str] | None = None
+        self.unsaved_changes = False
+        self.session = SessionStore()
+        # Built on first use so QtMultimedia stays out of the startup path
+        self.media_manager = None
+        self.media_pool = None
+        self.find_dialog = None
+        self.templates = None
+        # Memory tracing only starts once the report is first opened
+        self.memory_tracker = None
+        self.memory_dialog = None
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(60_000)
+        self.memory_timer.timeout.connect(self.sample_memory)
+        self.links = ClipLinkIndex(self)
+        self.active_link: ClipLink | None = None
+        # Sections whose large paste is being split, with their text from before the paste
+        self.pending_splits: dict[str, str | None] = {}
+        self._painted = False
 
         self.active_tag = None
 
+    def paintEvent(self, e):
+        super().paintEvent(e)
+        if not self._painted:
+            self._painted = True
+            self.first_painted.emit()
+            # The startup document is rendered once the window is on screen
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        self.text_editor.apply_editor_font()
+        # A restored session finishes startup once its file has been read
+        if self.restore_session(): return
+        self.new_file()
+        self.end_startup()
+
+    def end_startup(self):
+        for action in self.document_actions:
+            action.setEnabled(True)
+        self.startup_finished.emit()
+
+    def closeEvent(self, e):
+        self.save_session()
+        shutdown_pool()
+        super().closeEvent(e)
+
+    def on_script_updated(self, element_id: str, element_text: str):
+        self.cscr_file.set_property(element_id, "content", element_text)
+
     def update_title_bar(self, additional: str = ""):
         join_title = ""
         if additional != "":
@@ -68,26 +181,251 @@ class EditorWindow(QMainWindow):
 
     def new_file(self):
         """Handles creating a new .cscr file."""
-        self.cscr_file = CSCRTree()
+        self.start_document(CSCRTree())
+
+    def new_from_template(self):
+        """Creates a new script from a template, asking for any ${parameters} it uses."""
+        if self.templates is None:
+            from .templates import TemplateLibrary
+            self.templates = TemplateLibrary()
+        names = self.templates.names()
+        if self.templates.errors:
+            QMessageBox.warning(self, "Warning", "Some templates could not be loaded:\n" +
+                                "\n".join(f"{path}: {error}" for path, error in self.templates.errors.items()))
+        name, ok = QInputDialog.getItem(self, "New from Template", "Template:", names, 0, False)
+        if not ok: return
+        template = self.templates.get(name)
+        if template is None:
+            error = self.templates.errors.get(os.path.join(self.templates.directory, f"{name}.cscr"), "file was removed")
+            QMessageBox.critical(self, "Error", f"Could not load template {name}:\n{error}")
+            return
+
+        params = {}
+        for parameter in template.parameters:
+            value, ok = QInputDialog.getText(self, "New from Template", f"{parameter}:")
+            if not ok: return
+            params[parameter] = value
+        self.start_document(CSCRTree(root=template.instantiate(params)))
+
+    def start_document(self, cscr_file: CSCRTree):
+        self.attach_tree(cscr_file)
         self.active_filename = None
+        self.active_fingerprint = None
+        self.unsaved_changes = False
         self.tree_view.populate(self.cscr_file)
 
         self.update_title_bar(f"{self.cscr_file.get_tag_text("title")}")
 
         self.text_editor.render_script(self.cscr_file)
+        self.rebuild_links()
 
     def load_file(self):
         """Handles opening a .cscr file."""
-        self.active_filename, _ = QFileDialog.getOpenFileName(
+        filename, _ = QFileDialog.getOpenFileName(
             self, "Open File", "", "CSCR Files (*.cscr);;All Files (*)"
         )
-        if self.active_filename:
-            try:
-                self.cscr_file = CSCRTree.from_file(self.active_filename)
-                self.tree_view.populate(self.cscr_file)
-                self.text_editor.render_script(self.cscr_file)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Could not open file:\n{str(e)}")
+        if filename:
+            self.open_file(filename)
+
+    def open_file(self, filename: str) -> bool:
+        """Loads a .cscr file."""
+        try:
+            cscr_file = CSCRTree.from_file(filename)
+            if cscr_file is None: return False
+            self.attach_file(cscr_file, filename, file_fingerprint(filename))
+            self.render_views()
+            if self.cscr_file.validation_errors:
+                QMessageBox.warning(self, "Warning", "Some elements did not validate:\n" +
+                                    "\n".join(self.cscr_file.validation_errors[:10]))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not open file:\n{str(e)}")
+            return False
+        return True
+
+    def attach_file(self, cscr_file: CSCRTree, filename: str, fingerprint: tuple[float, int, str] | None):
+        self.attach_tree(cscr_file)
+        self.active_filename = filename
+        self.active_fingerprint = fingerprint
+        self.unsaved_changes = False
+        self.update_title_bar(f"{self.cscr_file.get_tag_text("title")}")
+
+    def on_large_paste(self, element_id: str, body: str):
+        """Commits a large paste. With splitting on, the commit waits for the split so both land as one change."""
+        if not self.split_large_pastes:
+            self.cscr_file.set_property(element_id, "content", body)
+            return
+
+        # What the tree held before the paste; if that changes, the section was edited during the split
+        self.pending_splits[element_id] = self.cscr_file.get_element(element_id).text
+        splitter = SectionSplitter(element_id, body)
+        splitter.signals.finished.connect(self.apply_split_paste)
+        QThreadPool.globalInstance().start(splitter)
+
+    def apply_split_paste(self, element_id: str, body: str, sections: list[tuple[str, str]]):
+        """Commits a pasted body and the sections split from it as one transaction."""
+        if element_id not in self.pending_splits: return
+        text_before = self.pending_splits.pop(element_id)
+        element = self.cscr_file.get_element(element_id)
+        parent = None if element is None else self.cscr_file.get_parent(element)
+        if parent is None: return
+        # Edited while the split was running: that commit already holds the paste, keep it unsplit
+        if element.text != text_before: return
+        if not sections:
+            sections = [("", body)]
+
+        index = list(parent).index(element)
+        readable = element.get("readable", "_tag_desc_body")
+        with self.cscr_file.transaction():
+            first_desc, first_body = sections[0]
+            if first_desc:
+                self.cscr_file.set_property(element_id, "desc", first_desc)
+            self.cscr_file.set_property(element_id, "content", first_body)
+            for offset, (description, body) in enumerate(sections[1:], 1):
+                self.cscr_file.create_element(element.tag, body, {"desc": description, "readable": readable},
+                                              parent, index + offset)
+
+    def on_section_entered(self, element_id: str):
+        """Pre-rolls the first clip linked to the section the cursor just entered."""
+        links = self.links.clips_for_section(element_id)
+        self.active_link = links[0] if links else None
+        if self.active_link is None: return
+
+        self.get_media_pool().prefetch(self.active_link.reference, self.active_link.start)
+
+    def get_media_pool(self):
+        """Media players shared by prefetch and the media manager, created on first use."""
+        if self.media_pool is None:
+            from ui.clip_player import MediaPlayerPool
+            self.media_pool = MediaPlayerPool(self)
+        return self.media_pool
+
+    def on_clip_selected(self, reference: str, clip_id: str):
+        """Jumps to the script section using a clip picked in the media manager."""
+        sections = self.links.sections_for_clip(reference, clip_id)
+        if sections:
+            self.text_editor.seek_to_element(sections[0])
+
+    def attach_tree(self, cscr_file: CSCRTree):
+        self.read_action.setChecked(False)
+        self.pending_splits.clear()
+        self.cscr_file = cscr_file
+        self.cscr_file.elements_changed.connect(self.on_elements_changed)
+        if self.find_dialog is not None:
+            self.find_dialog.set_script(cscr_file)
+
+    def on_elements_changed(self, changes: list[ElementChange]):
+        """Forwards a batch of tree changes to every view."""
+        self.unsaved_changes = True
+        self.text_editor.apply_changes(self.cscr_file, changes)
+        self.tree_view.apply_changes(self.cscr_file, changes)
+        self.links.apply_changes(self.cscr_file, changes)
+        self.minimap.invalidate([change.element_id for change in changes])
+        if any(change.kind in (ChangeKind.INSERTED, ChangeKind.REMOVED, ChangeKind.MOVED)
+               or change.attribute == "readable" for change in changes):
+            self.analyze_sections()
+        else:
+            # Attribute edits leave section bodies, and so their analysis, as they were
+            edited = [change.element_id for change in changes if change.kind is ChangeKind.TEXT_CHANGED]
+            for element_id in edited:
+                self.text_editor.set_section_metrics(element_id, None)
+            self.analyze_sections(edited)
+        for change in changes:
+            if change.kind is ChangeKind.TEXT_CHANGED and change.element.tag == "title":
+                self.update_title_bar(change.element.text)
+
+    def render_views(self):
+        self.tree_view.populate(self.cscr_file)
+        self.text_editor.render_script(self.cscr_file)
+        self.rebuild_links()
+        self.minimap.invalidate()
+        self.analyze_sections()
+
+    def rebuild_links(self):
+        base_dir = os.path.dirname(os.path.abspath(self.active_filename)) if self.active_filename else None
+        self.links.rebuild(self.cscr_file, base_dir)
+
+    def analyze_sections(self, element_ids: list[str] | None = None):
+        """Schedules text analysis of the given sections (all by default), visible ones first."""
+        if element_ids is None:
+            element_ids = list(self.text_editor.readable_offsets)
+        visible = self.text_editor.visible_sections()
+        for element_id in element_ids:
+            element = self.cscr_file.get_element(element_id)
+            if element is None or element_id not in self.text_editor.readable_offsets: continue
+            if not element.text or not element.text.strip(): continue
+            # Spans are drawn at body offsets, so measure the body as rendered, not as stored
+            self.analysis.schedule(element_id, self.text_editor.section_body(element_id), element_id in visible)
+
+    def restore_session(self) -> bool:
+        """Reopens the workspace saved on the last exit. The file is read off the GUI thread;
+        returns False if there is nothing to restore."""
+        snapshots = self.session.load()
+        if not snapshots: return False
+
+        loader = SessionLoader(snapshots[-1])
+        loader.signals.finished.connect(self.finish_restore)
+        QThreadPool.globalInstance().start(loader)
+        return True
+
+    def finish_restore(self, restored: RestoredFile):
+        """Shows a restored file. Problems go to the status bar: no dialogs before the user has done anything."""
+        snapshot = restored.snapshot
+        # A file opened while the session was being read wins over it
+        if self.cscr_file is not None:
+            self.end_startup()
+            return
+        if restored.root is None:
+            self.statusBar().showMessage(f"Could not reopen {snapshot.path}: {restored.error}")
+            self.new_file()
+            self.end_startup()
+            return
+
+        cscr_file = CSCRTree(root=restored.root)
+        cscr_file.validation_errors = restored.validation_errors
+        self.attach_file(cscr_file, snapshot.path, restored.fingerprint)
+        if restored.current:
+            # Snapshot is current: reuse the rendered text, offsets and outline as-is
+            elements = list(self.cscr_file.index_tree().items())
+            offsets = {}
+            for index, header_len, start, end in snapshot.readable_offsets:
+                if index < len(elements):
+                    offsets[elements[index][0]] = (header_len, start, end)
+            self.text_editor.restore_render(snapshot.document_text, offsets)
+            self.tree_view.restore(snapshot.outline, elements)
+            self.rebuild_links()
+            self.minimap.invalidate()
+            self.analyze_sections()
+        else:
+            self.render_views()
+        self.text_editor.restore_view(snapshot.cursor, snapshot.scroll)
+
+        if self.cscr_file.validation_errors:
+            self.statusBar().showMessage(f"{len(self.cscr_file.validation_errors)} elements did not validate; "
+                                         f"first: {self.cscr_file.validation_errors[0]}")
+        self.end_startup()
+
+    def save_session(self):
+        """Snapshots the open script so the next launch can reopen it instantly."""
+        if self.cscr_file is None or self.active_filename is None or self.active_fingerprint is None:
+            self.session.save([])
+            return
+
+        mtime, size, digest = self.active_fingerprint
+        cursor, scroll = self.text_editor.capture_view()
+        snapshot = FileSnapshot(os.path.abspath(self.active_filename), mtime, size, digest, cursor, scroll)
+
+        # Unsaved edits mean the view no longer matches the file; keep only the positions
+        if not self.unsaved_changes:
+            element_keys = {element_id: index for index, element_id in enumerate(self.cscr_file.index_tree())}
+            snapshot.document_text = self.text_editor.toPlainText()
+            snapshot.readable_offsets = [
+                (element_keys[element_id], *offset)
+                for element_id, offset in self.text_editor.readable_offsets.items()
+                if element_id in element_keys
+            ]
+            snapshot.outline = self.tree_view.capture(element_keys)
+
+        self.session.save([snapshot])
 
     def save_file(self):
         """Handles saving the current content to a .cscr file."""
@@ -96,27 +434,117 @@ class EditorWindow(QMainWindow):
                 self, "Save File", "", "CSCR Files (*.cscr);;All Files (*)"
             )
 
-        test_clip = { "title": "Testing Clip", "start": "0", "end": "10" }
-        test_element = ClipElement.validate(test_clip)
-        self.cscr_file.add_element(test_element)
         if self.active_filename:
             # Ensure the file has the .cscr extension
             if not self.active_filename.endswith(".cscr"):
                 self.active_filename += ".cscr"
             try:
                 self.cscr_file.to_file(self.active_filename)
+                self.active_fingerprint = file_fingerprint(self.active_filename)
+                self.unsaved_changes = False
+                # Relative clip refs now resolve against the folder the script was saved in
+                self.rebuild_links()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not save file:\n{str(e)}")
 
+    def export_file(self):
+        """Handles exporting the script to another format."""
+        from .exporters import exporters, export_tree
+
+        filters = {f"{exporter.description} (*{exporter.extension})": name for name, exporter in exporters.items()}
+        filename, selected_filter = QFileDialog.getSaveFileName(self, "Export Script", "", ";;".join(filters))
+        if not filename: return
+
+        format_name = filters.get(selected_filter, "md")
+        extension = exporters[format_name].extension
+        if not filename.endswith(extension):
+            filename += extension
+        try:
+            export_tree(self.cscr_file.root, filename, format_name)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not export file:\n{str(e)}")
+
     def set_title_dialog(self):
         new_title, ok = QInputDialog.getText(self, "New Script Title", "Enter a new title for this script...")
         if ok and len(new_title) > 0:
             for ele_id, element in self.cscr_file.index_tree().items():
                 if element.tag == "title":
                     self.cscr_file.set_property(ele_id, "content", new_title)
-                    self.update_title_bar(new_title)
                     return
 
+    def toggle_read_through(self, checked: bool):
+        if not checked:
+            self.teleprompter.stop()
+            self.pause_shortcut.setEnabled(False)
+            return
+        self.commit_pending_edits()
+        # Start from the section the cursor is in, or from the top
+        self.teleprompter.start(self.cscr_file, self.text_editor.section_element or None)
+        if not self.teleprompter.is_running():
+            self.read_action.setChecked(False)
+            return
+        self.pause_shortcut.setEnabled(True)
+
+    def on_outline_selected(self, element_id: str):
+        if self.teleprompter.is_running():
+            self.teleprompter.seek_to_section(element_id)
+
+    def open_find_replace(self):
+        if self.find_dialog is None:
+            from ui.find_replace import FindReplaceDialog
+            self.find_dialog = FindReplaceDialog(self)
+            self.find_dialog.search_started.connect(self.commit_pending_edits)
+        self.find_dialog.set_script(self.cscr_file)
+        self.find_dialog.show()
+        self.find_dialog.raise_()
+
+    def commit_pending_edits(self):
+        self.text_editor.commit_pending()
+
+    def open_memory_report(self):
+        if self.memory_tracker is None:
+            from .memory import MemoryTracker
+            from ui.memory_report import MemoryReportDialog
+            self.memory_tracker = MemoryTracker()
+            self.memory_dialog = MemoryReportDialog(self)
+            self.memory_dialog.refresh_requested.connect(self.show_memory_report)
+            self.memory_dialog.finished.connect(self.close_memory_report)
+        # Tracing slows everything down; it only runs while the report is open
+        self.memory_tracker.start()
+        self.memory_timer.start()
+        self.show_memory_report()
+        self.memory_dialog.show()
+        self.memory_dialog.raise_()
+
+    def close_memory_report(self):
+        self.memory_timer.stop()
+        self.memory_tracker.stop()
+
+    def sample_memory(self):
+        """Records a report for the growth history while the report is open."""
+        report = self.memory_tracker.sample_window(self)
+        if self.memory_dialog.isVisible():
+            self.memory_dialog.show_report(report, self.memory_tracker.history_summary())
+
+    def show_memory_report(self):
+        report = self.memory_tracker.sample_window(self)
+        self.memory_dialog.show_report(report, self.memory_tracker.history_summary())
+
+    def open_media_manager(self):
+        """Shows the media/reference manager, importing the clip player on first use."""
+        if self.media_manager is None:
+            from ui.clip_player import VideoPlayer
+            self.media_manager = VideoPlayer(self.get_media_pool())
+            self.media_manager.clip_selected.connect(self.on_clip_selected)
+
+        # Open on the clip linked to the current section, in the player prefetch already warmed up
+        if self.active_link is not None:
+            self.media_manager.load_reference(self.active_link.reference)
+            self.media_manager.set_position(self.active_link.start)
+
+        self.media_manager.show()
+        self.media_manager.raise_()
+
     def select_element(self, element: Element):
         _, off, __ = self.cscr_file.get_element_offset(element)
         self.text_editor.move_to_pos(off)
@@ -0,0 +1,243 @@
+# ~/projects/contenta/editor/exporters.py
+import os
+import re
+import textwrap
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, TextIO
+from xml.etree.ElementTree import Element
+
+from .cscr import CSCRTree
+from .pacing import DEFAULT_WORDS_PER_MINUTE, estimate_seconds, word_pattern
+
+
+exporters: dict[str, type["ScriptExporter"]] = {}
+""" Registry of exporters by format name """
+
+
+def register_exporter(cls: type["ScriptExporter"]) -> type["ScriptExporter"]:
+    exporters[cls.name] = cls
+    return cls
+
+
+@dataclass(frozen=True)
+class Section:
+    """ One readable part of a script, as exporters see it """
+    tag: str
+    header: str
+    body: str
+
+
+def _to_section(element: Element) -> Section | None:
+    header, body = CSCRTree.render_readable(element)
+    if header is None: return None
+    header = header.strip().strip("[]")
+    body = textwrap.dedent(body or "").strip()
+    return Section(str(element.tag), header, body)
+
+
+def iter_sections(root: Element) -> Iterator[Section]:
+    """Lazily yields the readable sections of an in-memory tree, in reading order."""
+    for element in root.iter():
+        section = _to_section(element)
+        if section is not None:
+            yield section
+
+
+def iter_file_sections(filepath: str) -> Iterator[Section]:
+    """Streams the readable sections of a .cscr file, holding one top-level element in memory at a time."""
+    depth = 0
+    root: Element | None = None
+    for event, element in ET.iterparse(filepath, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            # A top-level element is complete: export it, then let it go
+            yield from iter_sections(element)
+            root.remove(element)
+
+
+class ScriptExporter:
+    """ Writes a stream of sections straight to a file handle """
+    name: str = ""
+    extension: str = ""
+    description: str = ""
+
+    def __init__(self, words_per_minute: int = DEFAULT_WORDS_PER_MINUTE):
+        self.words_per_minute = words_per_minute
+
+    def export(self, sections: Iterable[Section], handle: TextIO) -> None:
+        self.begin(handle)
+        for section in sections:
+            self.write_section(section, handle)
+        self.end(handle)
+
+    def begin(self, handle: TextIO) -> None:
+        pass
+
+    def write_section(self, section: Section, handle: TextIO) -> None:
+        """For child classes to write their own format; plain header and body text by default"""
+        for text in (section.header, section.body):
+            if text:
+                handle.write(f"{text}\n\n")
+
+    def end(self, handle: TextIO) -> None:
+        pass
+
+
+@register_exporter
+class MarkdownExporter(ScriptExporter):
+    name = "md"
+    extension = ".md"
+    description = "Markdown"
+
+    def write_section(self, section: Section, handle: TextIO) -> None:
+        if section.header:
+            handle.write(f"## {section.header}\n\n")
+        if section.body:
+            handle.write(f"{section.body}\n\n")
+
+
+@register_exporter
+class TeleprompterExporter(ScriptExporter):
+    name = "txt"
+    extension = ".txt"
+    description = "Teleprompter Text"
+    width = 40
+
+    def write_section(self, section: Section, handle: TextIO) -> None:
+        if section.header:
+            handle.write(f"--- {section.header.upper()} ---\n\n")
+        for paragraph in re.split(r"\n\s*\n", section.body):
+            paragraph = " ".join(paragraph.split())
+            if paragraph:
+                handle.write(textwrap.fill(paragraph, self.width) + "\n\n")
+
+
+@register_exporter
+class SrtExporter(ScriptExporter):
+    """ Subtitle cues timed by the reading pace of each section """
+    name = "srt"
+    extension = ".srt"
+    description = "SubRip Subtitles"
+    decimal_separator = ","
+    words_per_cue = 12
+
+    def begin(self, handle: TextIO) -> None:
+        self.clock = 0.0
+        self.cue_index = 0
+
+    def timestamp(self, seconds: float) -> str:
+        milliseconds = int(round(seconds * 1000))
+        hours, milliseconds = divmod(milliseconds, 3_600_000)
+        minutes, milliseconds = divmod(milliseconds, 60_000)
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        return f"{hours:02}:{minutes:02}:{seconds:02}{self.decimal_separator}{milliseconds:03}"
+
+    def cues(self, body: str) -> Iterator[str]:
+        words = word_pattern.findall(body)
+        cue: list[str] = []
+        for word in words:
+            cue.append(word)
+            # Break at the end of a sentence, or when the cue is full
+            if len(cue) >= self.words_per_cue or (len(cue) > 3 and word[-1] in ".!?"):
+                yield " ".join(cue)
+                cue = []
+        if cue:
+            yield " ".join(cue)
+
+    def write_cue(self, handle: TextIO, start: float, end: float, text: str) -> None:
+        handle.write(f"{self.cue_index}\n{self.timestamp(start)} --> {self.timestamp(end)}\n{text}\n\n")
+
+    def write_section(self, section: Section, handle: TextIO) -> None:
+        for text in self.cues(section.body):
+            self.cue_index += 1
+            duration = estimate_seconds(text, self.words_per_minute)
+            self.write_cue(handle, self.clock, self.clock + duration, text)
+            self.clock += duration
+
+
+@register_exporter
+class WebVttExporter(SrtExporter):
+    name = "vtt"
+    extension = ".vtt"
+    description = "WebVTT Subtitles"
+    decimal_separator = "."
+
+    def begin(self, handle: TextIO) -> None:
+        super().begin(handle)
+        handle.write("WEBVTT\n\n")
+
+
+def export_tree(root: Element, filepath: str, format_name: str) -> None:
+    exporter = exporters[format_name]()
+    with open(filepath, "w", encoding="utf-8") as handle:
+        exporter.export(iter_sections(root), handle)
+
+
+@dataclass(frozen=True)
+class ExportResult:
+    source_path: str
+    target_path: str
+    error: str | None = None
+
+
+def export_file(source_path: str, format_name: str, target_path: str) -> ExportResult:
+    """Streams a .cscr file into the given format. Failures are reported in the result, not raised."""
+    exporter = exporters[format_name]()
+    try:
+        with open(target_path, "w", encoding="utf-8") as handle:
+            exporter.export(iter_file_sections(source_path), handle)
+    except (OSError, ET.ParseError) as e:
+        # Don't leave a half-written export behind
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        return ExportResult(source_path, target_path, str(e))
+    return ExportResult(source_path, target_path)
+
+
+def export_targets(source_paths: list[str], format_name: str, output_dir: str | None = None) -> list[str]:
+    """Output path of each script: next to it, or in output_dir. Scripts that would share
+    an output name in output_dir get their folder name as a prefix."""
+    extension = exporters[format_name].extension
+    targets = []
+    for path in source_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        targets.append(os.path.join(output_dir if output_dir is not None else os.path.dirname(path), stem + extension))
+
+    taken: dict[str, int] = {}
+    for target in targets:
+        key = os.path.normcase(os.path.abspath(target))
+        taken[key] = taken.get(key, 0) + 1
+    used: set[str] = set()
+    for index, (path, target) in enumerate(zip(source_paths, targets)):
+        key = os.path.normcase(os.path.abspath(target))
+        if taken[key] > 1:
+            folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem, extension = os.path.splitext(os.path.basename(target))
+            target = os.path.join(os.path.dirname(target), f"{folder}-{stem}{extension}")
+            count = 2
+            while os.path.normcase(os.path.abspath(target)) in used:
+                target = os.path.join(os.path.dirname(target), f"{folder}-{stem}-{count}{extension}")
+                count += 1
+            targets[index] = target
+        used.add(os.path.normcase(os.path.abspath(target)))
+    return targets
+
+
+def export_files(source_paths: list[str], format_name: str, output_dir: str | None = None,
+                 jobs: int | None = None) -> list[ExportResult]:
+    """Exports several scripts, in parallel worker processes when there is more than one."""
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    targets = export_targets(source_paths, format_name, output_dir)
+    if len(source_paths) == 1 or jobs == 1:
+        return [export_file(path, format_name, target) for path, target in zip(source_paths, targets)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(export_file, source_paths, [format_name] * len(source_paths), targets))
@@ -0,0 +1,190 @@
+# ~/projects/contenta/editor/find_replace.py
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .cscr import CSCRTree, ReadableSpec
+
+
+# Attributes searched alongside element text; "content" stands for the text itself
+SEARCH_FIELDS = ("content", "desc")
+
+# Below this many characters the work is done in-process; worker start-up would cost more
+PARALLEL_THRESHOLD = 2_000_000
+CHUNK_CHARS = 500_000
+
+
+@dataclass(frozen=True)
+class FindQuery:
+    pattern: str
+    regex: bool = False
+    case_sensitive: bool = False
+    whole_word: bool = False
+    fields: tuple[str, ...] = SEARCH_FIELDS
+
+    def compile(self) -> re.Pattern:
+        """Raises re.error for an invalid regex."""
+        return _compile(self.pattern, self.regex, self.case_sensitive, self.whole_word)
+
+
+@lru_cache(maxsize=32)
+def _compile(pattern: str, regex: bool, case_sensitive: bool, whole_word: bool) -> re.Pattern:
+    source = pattern if regex else re.escape(pattern)
+    if whole_word:
+        source = rf"\b(?:{source})\b"
+    return re.compile(source, 0 if case_sensitive else re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class FieldMatch:
+    element_id: str
+    field: str
+    count: int
+
+
+@dataclass(frozen=True)
+class FindPreview:
+    matches: tuple[FieldMatch, ...]
+
+    @property
+    def total(self) -> int:
+        return sum(match.count for match in self.matches)
+
+    @property
+    def element_ids(self) -> set[str]:
+        return {match.element_id for match in self.matches}
+
+    def summary(self) -> str:
+        if not self.matches: return "No matches"
+        sections = len(self.element_ids)
+        return f"{self.total} matches in {sections} element{'s' if sections != 1 else ''}"
+
+
+def _collect_fields(script: CSCRTree, fields: tuple[str, ...]) -> list[tuple[str, str, str]]:
+    """(element id, field, text) for every searchable field in the tree.
+    Only what a readable element shows is searched; layout text between elements never is."""
+    targets = []
+    for element in script.root.iter():
+        readable = element.get("readable", None)
+        if readable is None: continue
+        spec = ReadableSpec.compile(readable)
+        shown = {"content": spec.show_body, "desc": spec.show_desc}
+        element_id = script.element_key(element)
+        for field in fields:
+            if not shown.get(field, False): continue
+            text = element.text if field == "content" else element.get(field, None)
+            if text:
+                targets.append((element_id, field, text))
+    return targets
+
+
+def _chunks(texts: list[str]) -> list[tuple[int, int]]:
+    """Splits the texts into [start, end) index ranges of roughly CHUNK_CHARS characters."""
+    ranges = []
+    start, size = 0, 0
+    for index, text in enumerate(texts):
+        size += len(text)
+        if size >= CHUNK_CHARS:
+            ranges.append((start, index + 1))
+            start, size = index + 1, 0
+    if start < len(texts):
+        ranges.append((start, len(texts)))
+    return ranges
+
+
+def _count_chunk(pattern: re.Pattern, texts: list[str]) -> list[int]:
+    return [sum(1 for _ in pattern.finditer(text)) for text in texts]
+
+
+def _replace_chunk(pattern: re.Pattern, replacement: str, texts: list[str]) -> list[tuple[str, int]]:
+    return [pattern.subn(replacement, text) for text in texts]
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_jobs: int | None = None
+
+
+def shutdown_pool() -> None:
+    """Stops the worker pool, cancelling anything still queued."""
+    global _pool, _pool_jobs
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool, _pool_jobs = None, None
+
+
+def _get_pool(jobs: int | None) -> ProcessPoolExecutor:
+    """Worker pool shared by every parallel run, started on first use so later runs skip interpreter start-up."""
+    global _pool, _pool_jobs
+    if _pool is None or _pool_jobs != jobs:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # Forking a process that runs Qt threads is unsafe; start clean interpreters instead
+        _pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+        _pool_jobs = jobs
+    return _pool
+
+
+def _run(worker, pattern: re.Pattern, texts: list[str], jobs: int | None, *extra) -> list:
+    """Runs a chunk worker over all texts, in worker processes when the input is large enough."""
+    if jobs == 1 or sum(len(text) for text in texts) < PARALLEL_THRESHOLD:
+        return worker(pattern, *extra, texts)
+
+    pool = _get_pool(jobs)
+    futures = [pool.submit(worker, pattern, *extra, texts[start:end]) for start, end in _chunks(texts)]
+    return [result for future in futures for result in future.result()]
+
+
+def find_in_tree(script: CSCRTree, query: FindQuery, jobs: int | None = 1) -> FindPreview:
+    """Counts matches per element and field, without changing anything."""
+    pattern = query.compile()
+    targets = _collect_fields(script, query.fields)
+    counts = _run(_count_chunk, pattern, [text for _, _, text in targets], jobs)
+    return FindPreview(tuple(
+        FieldMatch(element_id, field, count)
+        for (element_id, field, _), count in zip(targets, counts) if count
+    ))
+
+
+@dataclass(frozen=True)
+class ReplacePlan:
+    """ A Replace All worked out against the tree's texts as they were when it was planned.
+        compute() touches no tree and may run on any thread; apply() writes the result back. """
+    pattern: re.Pattern
+    replacement: str
+    targets: tuple[tuple[str, str, str], ...]
+    """ (element id, field, text) of every searched field """
+
+    def compute(self, jobs: int | None = 1) -> list[tuple[str, int]]:
+        return _run(_replace_chunk, self.pattern, [text for _, _, text in self.targets], jobs, self.replacement)
+
+    def apply(self, script: CSCRTree, results: list[tuple[str, int]]) -> int:
+        """Writes the replacements as one tree transaction, so views update once. Fields edited
+        since the plan was made are left alone. Returns the number of replacements."""
+        total = 0
+        with script.transaction():
+            for (element_id, field, text), (new_text, count) in zip(self.targets, results):
+                if count == 0 or new_text == text: continue
+                element = script.get_element(element_id)
+                if element is None: continue
+                current = element.text if field == "content" else element.get(field, None)
+                if current != text: continue
+                script.set_property(element_id, field, new_text)
+                total += count
+        return total
+
+
+def plan_replace(script: CSCRTree, query: FindQuery, replacement: str) -> ReplacePlan:
+    """Raises re.error for an invalid regex."""
+    pattern = query.compile()
+    if not query.regex:
+        # A literal replacement must not expand backslashes or group references
+        replacement = replacement.replace("\\", "\\\\")
+    return ReplacePlan(pattern, replacement, tuple(_collect_fields(script, query.fields)))
+
+
+def replace_in_tree(script: CSCRTree, query: FindQuery, replacement: str, jobs: int | None = 1) -> int:
+    """Replaces every match as one tree transaction. Returns the number of replacements."""
+    plan = plan_replace(script, query, replacement)
+    return plan.apply(script, plan.compute(jobs))
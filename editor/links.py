@@ -0,0 +1,89 @@
+# ~/projects/contenta/editor/links.py
+import os
+from dataclasses import dataclass
+from xml.etree.ElementTree import Element
+
+from PyQt6.QtCore import QObject
+
+from .cscr import CSCRTree, ChangeKind, ElementChange
+
+
+def clip_key(start: int, end: int) -> str:
+    """Id of a clip within its reference video."""
+    return f"{start}-{end}"
+
+
+def reference_key(filename: str, base_dir: str | None = None) -> str:
+    """Normalised path of a reference; relative paths are taken from base_dir (the script's folder) if given."""
+    if base_dir is not None and not os.path.isabs(filename):
+        filename = os.path.join(base_dir, filename)
+    return os.path.normcase(os.path.abspath(filename))
+
+
+@dataclass(frozen=True)
+class ClipLink:
+    element_id: str
+    """ Key of the <clip> element in the script """
+    section_id: str
+    """ Key of the readable section the clip belongs to """
+    reference: str
+    clip_id: str
+    start: int
+    end: int
+
+
+class ClipLinkIndex(QObject):
+    """ Two-way index between script sections and the reference clips they use.
+        A <clip> belongs to the section it is nested in, or else to the closest readable section before it. """
+
+    def __init__(self, parent: QObject | None = None):
+        super().__init__(parent)
+        self.by_section: dict[str, list[ClipLink]] = {}
+        self.by_clip: dict[tuple[str, str], list[ClipLink]] = {}
+        self.base_dir: str | None = None
+        """ Folder of the script file, which relative clip refs are resolved against """
+
+    def rebuild(self, script: CSCRTree, base_dir: str | None = None) -> None:
+        self.base_dir = base_dir
+        self.by_section.clear()
+        self.by_clip.clear()
+
+        section_id: str | None = None
+        for child in script.root:
+            if child.get("readable", None) is not None:
+                section_id = script.element_key(child)
+            for clip in child.iter("clip"):
+                # A clip nested in this child belongs to it; a bare clip to the section before it
+                owner = section_id
+                if clip is not child and child.get("readable", None) is not None:
+                    owner = script.element_key(child)
+                if owner is not None:
+                    self._add(script, clip, owner)
+
+    def _add(self, script: CSCRTree, clip: Element, section_id: str) -> None:
+        reference = clip.get("ref", None)
+        try:
+            start, end = int(clip.get("start", "")), int(clip.get("end", ""))
+        except ValueError:
+            return
+        if reference is None: return
+
+        link = ClipLink(script.element_key(clip), section_id, reference_key(reference, self.base_dir),
+                        clip_key(start, end), start, end)
+        self.by_section.setdefault(section_id, []).append(link)
+        self.by_clip.setdefault((link.reference, link.clip_id), []).append(link)
+
+    def apply_changes(self, script: CSCRTree, changes: list[ElementChange]) -> None:
+        """Keeps the index in step with the tree; text edits of sections never affect it."""
+        for change in changes:
+            if change.kind is ChangeKind.TEXT_CHANGED and change.element.tag != "clip": continue
+            if change.kind is ChangeKind.ATTRIBUTE_CHANGED and change.element.tag != "clip" \
+                    and change.attribute != "readable": continue
+            self.rebuild(script, self.base_dir)
+            return
+
+    def clips_for_section(self, section_id: str) -> list[ClipLink]:
+        return self.by_section.get(section_id, [])
+
+    def sections_for_clip(self, reference: str, clip_id: str) -> list[str]:
+        return [link.section_id for link in self.by_clip.get((reference_key(reference), clip_id), [])]
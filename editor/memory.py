@@ -0,0 +1,213 @@
+# ~/projects/contenta/editor/memory.py
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from xml.etree.ElementTree import Element
+
+from .cscr import CSCRTree, parse_cscr
+
+
+# Frames kept per traced allocation; more frames cost more memory while tracing
+TRACE_FRAMES = 4
+HISTORY_LENGTH = 120
+TOP_ALLOCATIONS = 10
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class Usage:
+    """ Object count and approximate size of one subsystem """
+    count: int
+    bytes: int
+    note: str = ""
+
+
+@dataclass(frozen=True)
+class MemoryReport:
+    taken_at: float
+    sections: int
+    subsystems: dict[str, Usage]
+    traced_current: int = 0
+    traced_peak: int = 0
+    top_allocations: tuple[tuple[str, int], ...] = ()
+    """ (file, bytes) of the largest traced allocation sites """
+    growth: tuple[tuple[str, int], ...] = ()
+    """ (file, bytes) of the largest changes since the previous report """
+
+    @property
+    def accounted_bytes(self) -> int:
+        return sum(usage.bytes for usage in self.subsystems.values())
+
+    @property
+    def bytes_per_section(self) -> float:
+        return self.accounted_bytes / self.sections if self.sections else 0.0
+
+    def summary(self) -> str:
+        lines = [f"Sections: {self.sections}, {format_bytes(self.bytes_per_section)} per section"]
+        if self.traced_current:
+            lines.append(f"Traced Python memory: {format_bytes(self.traced_current)} "
+                         f"(peak {format_bytes(self.traced_peak)})")
+        lines.append("")
+        for name, usage in self.subsystems.items():
+            note = f"  ({usage.note})" if usage.note else ""
+            lines.append(f"{name:<18}{usage.count:>9}  {format_bytes(usage.bytes):>10}{note}")
+        if self.top_allocations:
+            lines.append("\nLargest allocation sites:")
+            lines.extend(f"  {format_bytes(size):>10}  {site}" for site, size in self.top_allocations)
+        if self.growth:
+            lines.append("\nChange since previous report:")
+            lines.extend(f"  {format_signed(size):>10}  {site}" for site, size in self.growth)
+        return "\n".join(lines)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_signed(size: int) -> str:
+    return ("+" if size >= 0 else "-") + format_bytes(abs(size))
+
+
+def tree_usage(root: Element) -> Usage:
+    """Elements with their text and attributes, as seen from Python."""
+    count, size = 0, 0
+    for element in root.iter():
+        count += 1
+        size += sys.getsizeof(element)
+        # element.attrib would create a dict on elements without attributes; only look when there are some
+        attributes = element.items()
+        if attributes:
+            size += sys.getsizeof(element.attrib)
+        for value in (element.text, element.tail, *(value for _, value in attributes)):
+            if value is not None:
+                size += sys.getsizeof(value)
+    return Usage(count, size)
+
+
+def offsets_usage(offsets: dict[str, tuple[int, int, int]]) -> Usage:
+    size = sys.getsizeof(offsets)
+    for key, value in offsets.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(number) for number in value)
+    return Usage(len(offsets), size)
+
+
+def count_sections(root: Element) -> int:
+    return sum(1 for element in root.iter() if element.get("readable", None) is not None)
+
+
+def window_usage(window) -> dict[str, Usage]:
+    """Object counts per editor subsystem. Qt-side sizes are estimates: tracemalloc cannot see them."""
+    usage: dict[str, Usage] = {}
+    if window.cscr_file is not None:
+        usage["tree"] = tree_usage(window.cscr_file.root)
+
+    document = window.text_editor.document()
+    # QString holds UTF-16; each block carries its own layout on top of that
+    usage["document"] = Usage(document.blockCount(), 2 * document.characterCount() + 256 * document.blockCount(),
+                              "estimate")
+    usage["readable_offsets"] = offsets_usage(window.text_editor.readable_offsets)
+    outline = window.tree_view
+    usage["outline"] = Usage(outline.item_count(), 2 * outline.caption_length(), "captions only")
+    usage["minimap"] = Usage(len(window.minimap.section_images), sum(
+        image.sizeInBytes() for _, image in window.minimap.section_images.values()
+    ))
+    usage["analysis cache"] = Usage(len(window.analysis.cache), sum(
+        sys.getsizeof(metrics) + sys.getsizeof(metrics.repeated_spans) for metrics in window.analysis.cache.values()
+    ))
+
+    pool = window.media_pool
+    if pool is not None:
+        loaded = sum(1 for player in pool.players.values() if not player.source().isEmpty())
+        usage["media players"] = Usage(len(pool.players), 0, f"{loaded} loaded, decoder memory not counted")
+    return usage
+
+
+def _traced_sites(statistics) -> tuple[tuple[str, int], ...]:
+    sites = []
+    for stat in statistics[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        filename = frame.filename
+        if filename.startswith(PROJECT_DIR):
+            filename = os.path.relpath(filename, PROJECT_DIR)
+        # StatisticDiff carries the change since the older snapshot
+        sites.append((f"{filename}:{frame.lineno}", getattr(stat, "size_diff", stat.size)))
+    return tuple(sites)
+
+
+class MemoryTracker:
+    """ Takes memory reports and keeps their history, so growth over a session shows up """
+
+    def __init__(self, history_length: int = HISTORY_LENGTH):
+        self.history: deque[MemoryReport] = deque(maxlen=history_length)
+        self._snapshot: tracemalloc.Snapshot | None = None
+        # Tracing someone else started (e.g. PYTHONTRACEMALLOC) is left running on stop
+        self._tracing = False
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._tracing = True
+
+    def stop(self) -> None:
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self._snapshot = None
+
+    def sample(self, subsystems: dict[str, Usage], sections: int) -> MemoryReport:
+        top, growth = (), ()
+        current = peak = 0
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            top = _traced_sites(snapshot.statistics("lineno"))
+            if self._snapshot is not None:
+                growth = _traced_sites(snapshot.compare_to(self._snapshot, "lineno"))
+            self._snapshot = snapshot
+
+        report = MemoryReport(time.time(), sections, subsystems, current, peak, top, growth)
+        self.history.append(report)
+        return report
+
+    def sample_window(self, window) -> MemoryReport:
+        sections = count_sections(window.cscr_file.root) if window.cscr_file is not None else 0
+        return self.sample(window_usage(window), sections)
+
+    def history_summary(self) -> str:
+        """One line per report: time, sections, accounted and traced bytes."""
+        if not self.history: return ""
+        start = self.history[0].taken_at
+        lines = []
+        for report in self.history:
+            lines.append(f"{report.taken_at - start:>7.0f}s  {report.sections:>6} sections  "
+                         f"{format_bytes(report.accounted_bytes):>10}  traced {format_bytes(report.traced_current)}")
+        return "\n".join(lines)
+
+
+def file_report(filepath: str) -> MemoryReport:
+    """Memory taken by one script once parsed and rendered, without any views."""
+    tracker = MemoryTracker()
+    tracker.start()
+    tree = CSCRTree(root=parse_cscr(filepath)[0])
+    for element in tree.root.iter():
+        tree.get_readable(element)
+    rendered = tree.rendered_texts()
+
+    report = tracker.sample({
+        "tree": tree_usage(tree.root),
+        "rendered text": Usage(len(rendered), sum(
+            sys.getsizeof(header) + sys.getsizeof(body) for header, body in rendered
+        )),
+    }, count_sections(tree.root))
+    tracker.stop()
+    return report
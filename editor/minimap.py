@@ -0,0 +1,139 @@
+# ~/projects/contenta/editor/minimap.py
+from PyQt6.QtCore import Qt, QRect, QPoint, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter, QTextCursor
+from PyQt6.QtWidgets import QWidget, QSizePolicy
+
+from .text_area import TextArea
+
+
+# Characters per minimap row; one pixel per character before scaling
+MINIMAP_COLUMNS = 80
+
+
+class Minimap(QWidget):
+    """ Downsampled overview of the script, drawn from cached per-section images """
+
+    element_clicked = pyqtSignal(str)
+
+    def __init__(self, text_area: TextArea, parent: QWidget | None = None):
+        super().__init__(parent)
+        self.text_area = text_area
+        self.setFixedWidth(MINIMAP_COLUMNS + 10)
+        self.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Expanding)
+
+        self.background: QColor = QColor(12, 12, 12, 255)
+        self.header_color: QColor = QColor(200, 255, 200, 255)
+        self.body_color: QColor = QColor(140, 140, 140, 255)
+        self.viewport_color: QColor = QColor(255, 255, 255, 40)
+
+        # element id -> ((header length, body length), image); only redrawn when touched
+        self.section_images: dict[str, tuple[tuple[int, int], QImage]] = {}
+        # (element id, top, height) in minimap pixels, rebuilt from the section offsets
+        self.rows: list[tuple[str, int, int]] = []
+        self._layout_key: tuple | None = None
+
+        self.text_area.verticalScrollBar().valueChanged.connect(self.update)
+
+    def invalidate(self, element_ids: list[str] | None = None):
+        """Drops the cached images of the given sections (all if None) and repaints."""
+        if element_ids is None:
+            self.section_images.clear()
+        else:
+            for element_id in element_ids:
+                self.section_images.pop(element_id, None)
+        self.update()
+
+    def _section_lines(self, offset: tuple[int, int, int]) -> int:
+        h_len, start, end = offset
+        return 1 + max(1, (end - start) // MINIMAP_COLUMNS)
+
+    def _layout(self):
+        offsets = self.text_area.readable_offsets
+        layout_key = (self.height(), tuple(offsets.values()))
+        if layout_key == self._layout_key: return
+        self._layout_key = layout_key
+
+        # Forget sections that no longer exist
+        for element_id in list(self.section_images):
+            if element_id not in offsets:
+                del self.section_images[element_id]
+
+        total_lines = sum(self._section_lines(offset) for offset in offsets.values()) or 1
+        scale = min(1.0, self.height() / total_lines)
+        self.rows = []
+        top = 0.0
+        for element_id, offset in offsets.items():
+            height = self._section_lines(offset) * scale
+            self.rows.append((element_id, int(top), max(1, int(top + height) - int(top))))
+            top += height
+
+    def _render_section(self, element_id: str, offset: tuple[int, int, int]) -> QImage:
+        h_len, start, end = offset
+        # Positions shift whenever an earlier section is edited; only the size matters here
+        size = (h_len, end - start)
+        cached = self.section_images.get(element_id, None)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+
+        image = QImage(MINIMAP_COLUMNS, self._section_lines(offset), QImage.Format.Format_ARGB32)
+        image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(image)
+        if h_len > 0:
+            painter.fillRect(QRect(0, 0, MINIMAP_COLUMNS, 1), self.header_color)
+
+        cursor = QTextCursor(self.text_area.document())
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        body = cursor.selectedText()
+        painter.setPen(self.body_color)
+        row = 1
+        # selectedText() separates paragraphs with U+2029
+        for line in body.split("\u2029"):
+            # Long paragraphs wrap over several rows; each row shows how full it is
+            for column in range(0, max(len(line), 1), MINIMAP_COLUMNS):
+                if row >= image.height(): break
+                length = len(line[column:column + MINIMAP_COLUMNS].rstrip())
+                if length > 0:
+                    painter.drawLine(0, row, length - 1, row)
+                row += 1
+        painter.end()
+
+        self.section_images[element_id] = (size, image)
+        return image
+
+    def paintEvent(self, e):
+        self._layout()
+        offsets = self.text_area.readable_offsets
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        for element_id, top, height in self.rows:
+            if top > e.rect().bottom() or top + height < e.rect().top(): continue
+            offset = offsets.get(element_id, None)
+            if offset is None: continue
+            image = self._render_section(element_id, offset)
+            painter.drawImage(QRect(5, top, MINIMAP_COLUMNS, height), image)
+
+        viewport = self.text_area.viewport().rect()
+        first = self._position_to_y(self.text_area.cursorForPosition(viewport.topLeft()).position())
+        last = self._position_to_y(self.text_area.cursorForPosition(viewport.bottomRight() - QPoint(1, 1)).position())
+        if first is not None and last is not None:
+            painter.fillRect(QRect(0, first, self.width(), max(2, last - first)), self.viewport_color)
+        painter.end()
+
+    def _position_to_y(self, position: int) -> int | None:
+        offsets = self.text_area.readable_offsets
+        for element_id, top, height in self.rows:
+            h_len, start, end = offsets[element_id]
+            if position <= end:
+                span = max(1, end - (start - h_len))
+                fraction = min(1.0, max(0.0, (position - (start - h_len)) / span))
+                return top + int(fraction * height)
+        return self.rows[-1][1] + self.rows[-1][2] if self.rows else None
+
+    def mousePressEvent(self, e):
+        y = int(e.position().y())
+        for element_id, top, height in self.rows:
+            if y < top + height:
+                self.element_clicked.emit(element_id)
+                return
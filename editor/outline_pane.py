@@ -5,7 +5,7 @@ from PyQt6.QtWidgets import QTreeView
 from PyQt6.QtGui import QStandardItem, QStandardItemModel
 from PyQt6.QtCore import Qt, pyqtSignal
 
-from editor.cscr import CSCRTree
+from editor.cscr import CSCRTree, ChangeKind, ElementChange
 
 
 class OutlinePane(QTreeView):
@@ -16,6 +16,8 @@ class OutlinePane(QTreeView):
         self.model = QStandardItemModel()
         self.model.setHorizontalHeaderLabels(["Script Outline"])
         self.setModel(self.model)
+        # Outline rows by element key, for updating captions in place
+        self._items: dict[str, QStandardItem] = {}
 
         self.clicked.connect(self.on_tree_item_selected)
 
@@ -23,32 +25,113 @@ class OutlinePane(QTreeView):
         """Populates the tree view with the script structure."""
         self.model.clear()
         self.model.setHorizontalHeaderLabels(["Script Outline"])
+        self._items.clear()
 
         for element_id, element in script.index_tree().items():
 
             if element.tag == "title": continue
 
-            caption = CSCRTree.get_readable(element)[0]
+            caption = script.get_readable(element)[0]
             if caption is None: continue
             item = QStandardItem(sub(r"[\[\]]", "", caption))
             item.setData(element, Qt.ItemDataRole.UserRole)
             item.setData(element_id, Qt.ItemDataRole.UserRole + 1)
             item.setEditable(False)
-            self._depth_populate(element, item)
+            self._items[element_id] = item
+            self._depth_populate(script, element, item)
             self.model.appendRow(item)
 
-    def _depth_populate(self, element: Element, parent_obj: QStandardItem | QStandardItemModel):
+    def _depth_populate(self, script: CSCRTree, element: Element, parent_obj: QStandardItem | QStandardItemModel):
         for child in element:
-            child_item = QStandardItem(child.tag.capitalize())
+            caption = script.get_readable(child)[0]
+            if not caption:
+                caption = child.tag.capitalize()
+            child_item = QStandardItem(sub(r"[\[\]]", "", caption))
+            child_item.setData(child, Qt.ItemDataRole.UserRole)
+            child_item.setData(script.element_key(child), Qt.ItemDataRole.UserRole + 1)
+            child_item.setEditable(False)
+            self._items.setdefault(script.element_key(child), child_item)
 
-            caption = CSCRTree.get_readable(element)[0]
-            item = QStandardItem(sub(r"[\[\]]", "", caption))
-            item.setData(element, Qt.ItemDataRole.UserRole)
-            item.setData(element.get("id"), Qt.ItemDataRole.UserRole + 1)
+            parent_obj.appendRow(child_item)
+            self._depth_populate(script, child, child_item)
+
+    def apply_changes(self, script: CSCRTree, changes: list[ElementChange]):
+        """Updates the outline from a batch of tree changes."""
+        if any(change.kind in (ChangeKind.INSERTED, ChangeKind.REMOVED, ChangeKind.MOVED)
+               or change.attribute == "readable" for change in changes):
+            self.populate(script)
+            return
+
+        for change in changes:
+            if change.kind is not ChangeKind.ATTRIBUTE_CHANGED: continue
+            item = self._items.get(change.element_id, None)
+            if item is None: continue
+            caption = script.get_readable(change.element)[0]
+            if caption:
+                item.setText(sub(r"[\[\]]", "", caption))
+
+    def set_section_metrics(self, element_id: str, metrics):
+        """Shows a section's analysis results as the tooltip of its outline row."""
+        item = self._items.get(element_id, None)
+        if item is not None:
+            item.setToolTip(metrics.summary() if metrics is not None else "")
+
+    def capture(self, element_keys: dict[str, int]) -> list[dict]:
+        """Serializes the outline rows and their expansion state, keyed by walk index."""
+        return self._capture_rows(self.model.invisibleRootItem(), element_keys)
+
+    def _capture_rows(self, parent_item: QStandardItem, element_keys: dict[str, int]) -> list[dict]:
+        rows = []
+        for row in range(parent_item.rowCount()):
+            item = parent_item.child(row)
+            rows.append({
+                "text": item.text(),
+                "index": element_keys.get(item.data(Qt.ItemDataRole.UserRole + 1), None),
+                "expanded": self.isExpanded(item.index()),
+                "children": self._capture_rows(item, element_keys),
+            })
+        return rows
+
+    def restore(self, rows: list[dict], elements: list[tuple[str, Element]]):
+        """Rebuilds the outline from a captured state without re-reading the script."""
+        self.model.clear()
+        self.model.setHorizontalHeaderLabels(["Script Outline"])
+        self._items.clear()
+
+        expanded = []
+        self._restore_rows(rows, elements, self.model.invisibleRootItem(), expanded)
+        for item in expanded:
+            self.setExpanded(item.index(), True)
+
+    def _restore_rows(self, rows: list[dict], elements: list[tuple[str, Element]],
+                      parent_item: QStandardItem, expanded: list[QStandardItem]):
+        for row in rows:
+            item = QStandardItem(row.get("text", ""))
+            index = row.get("index", None)
+            if index is not None and index < len(elements):
+                element_id, element = elements[index]
+                item.setData(element, Qt.ItemDataRole.UserRole)
+                item.setData(element_id, Qt.ItemDataRole.UserRole + 1)
+                self._items.setdefault(element_id, item)
             item.setEditable(False)
+            parent_item.appendRow(item)
+            if row.get("expanded", False):
+                expanded.append(item)
+            self._restore_rows(row.get("children", []), elements, item, expanded)
 
-            parent_obj.appendRow(child_item)
-            self._depth_populate(child, child_item)
+    def item_count(self) -> int:
+        return len(self._items)
+
+    def caption_length(self) -> int:
+        """Characters held by all outline captions."""
+        return sum(len(item.text()) for item in self._items.values())
+
+    def select_element(self, element_id: str):
+        """Marks an element's row as current without emitting element_selected."""
+        item = self._items.get(element_id, None)
+        if item is None: return
+        self.setCurrentIndex(item.index())
+        self.scrollTo(item.index())
 
     def on_tree_item_selected(self, index):
         self.element_selected.emit(self.model.itemFromIndex(index).data(Qt.ItemDataRole.UserRole + 1))
@@ -0,0 +1,17 @@
+# ~/projects/contenta/editor/pacing.py
+import re
+
+
+# Typical narration speed for video essays
+DEFAULT_WORDS_PER_MINUTE = 150
+
+word_pattern = re.compile(r"\S+")
+
+
+def word_count(text: str) -> int:
+    return sum(1 for _ in word_pattern.finditer(text))
+
+
+def estimate_seconds(text: str, words_per_minute: int = DEFAULT_WORDS_PER_MINUTE) -> float:
+    """Estimated time to read text aloud at the given pace."""
+    return word_count(text) * 60.0 / max(words_per_minute, 1)
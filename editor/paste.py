@@ -0,0 +1,117 @@
+# ~/projects/contenta/editor/paste.py
+import re
+
+from PyQt6.QtCore import QObject, QRunnable, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+
+
+# Pastes at least this long go through ChunkedInserter instead of QPlainTextEdit
+LARGE_PASTE_THRESHOLD = 32 * 1024
+PASTE_CHUNK_SIZE = 8 * 1024
+SPLIT_SECTION_CHARS = 4000
+
+heading_pattern = re.compile(r"^\s*#{1,6}\s+(?P<title>.+?)\s*#*\s*$")
+paragraph_pattern = re.compile(r"\n[ \t]*\n")
+
+
+def split_sections(text: str, max_chars: int = SPLIT_SECTION_CHARS) -> list[tuple[str, str]]:
+    """Splits text into (description, body) sections at markdown headings,
+    and at paragraph boundaries once a section grows past max_chars."""
+    sections: list[tuple[str, str]] = []
+    heading_text = "Pasted"
+    description = ""
+    paragraphs: list[str] = []
+    size = 0
+    part = 1
+    # A heading with nothing under it still becomes a (empty) section
+    heading_pending = False
+
+    def flush():
+        nonlocal paragraphs, size, heading_pending
+        if paragraphs or heading_pending:
+            sections.append((description, "\n\n".join(paragraphs)))
+        paragraphs = []
+        size = 0
+        heading_pending = False
+
+    for paragraph in paragraph_pattern.split(text):
+        paragraph = paragraph.strip("\n")
+        if paragraph.strip() == "": continue
+
+        first_line, _, rest = paragraph.partition("\n")
+        heading = heading_pattern.match(first_line)
+        if heading is not None:
+            flush()
+            heading_text = heading.group("title")
+            description = heading_text
+            part = 1
+            heading_pending = True
+            paragraph = rest.strip("\n")
+            if paragraph == "": continue
+        elif size > 0 and size + len(paragraph) > max_chars:
+            flush()
+            part += 1
+            description = f"{heading_text} ({part})"
+
+        paragraphs.append(paragraph)
+        size += len(paragraph)
+
+    flush()
+    return sections
+
+
+class SplitterSignals(QObject):
+    finished = pyqtSignal(str, str, list)
+    """ Emitted with the element id, the text that was split and its list of (description, body) sections """
+
+
+class SectionSplitter(QRunnable):
+    """ Splits a pasted section body into sections on a worker thread """
+
+    def __init__(self, element_id: str, text: str, max_chars: int = SPLIT_SECTION_CHARS):
+        super().__init__()
+        self.element_id = element_id
+        self.text = text
+        self.max_chars = max_chars
+        self.signals = SplitterSignals()
+
+    def run(self):
+        self.signals.finished.emit(self.element_id, self.text, split_sections(self.text, self.max_chars))
+
+
+class ChunkedInserter(QObject):
+    """ Inserts a long text into a document a chunk per event loop turn, so the editor stays responsive """
+
+    finished = pyqtSignal(int, int)
+    """ Emitted with the start and end positions of the inserted text """
+
+    def __init__(self, text_edit, position: int, text: str, chunk_size: int = PASTE_CHUNK_SIZE):
+        super().__init__(text_edit)
+        self.text_edit = text_edit
+        self.start_pos = position
+        self.position = position
+        self.text = text
+        self.chunk_size = chunk_size
+        self.sent = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.insert_chunk)
+
+    def start(self):
+        self.timer.start()
+
+    def insert_chunk(self):
+        chunk = self.text[self.sent:self.sent + self.chunk_size]
+        # The whole paste is committed once at the end; keep per-chunk edits off the debouncer
+        self.text_edit.blockSignals(True)
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.setPosition(self.position)
+        cursor.insertText(chunk)
+        self.text_edit.blockSignals(False)
+
+        self.sent += len(chunk)
+        self.position += len(chunk)
+        if self.sent >= len(self.text):
+            self.timer.stop()
+            self.finished.emit(self.start_pos, self.position)
@@ -0,0 +1,141 @@
+# ~/projects/contenta/editor/session.py
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any
+from xml.etree.ElementTree import Element, ParseError
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from .cscr import parse_cscr
+
+
+SESSION_FILE = Path.home() / ".contenta" / "session.json"
+session_version = 2
+
+
+def file_digest(filepath: str) -> str | None:
+    try:
+        with open(filepath, "rb") as handle:
+            return hashlib.file_digest(handle, "sha256").hexdigest()
+    except OSError:
+        return None
+
+
+def file_fingerprint(filepath: str) -> tuple[float, int, str] | None:
+    """Returns the (mtime, size, sha256) triple used to validate a snapshot against its file."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    digest = file_digest(filepath)
+    if digest is None: return None
+    return stat.st_mtime, stat.st_size, digest
+
+
+@dataclass
+class FileSnapshot:
+    """ View state of one open script, plus the derived state needed to redraw it """
+    path: str
+    mtime: float
+    size: int
+    sha256: str
+    cursor: int = 0
+    scroll: int = 0
+    # Derived state; empty when the view did not match the file on disk
+    document_text: str = ""
+    """ Rendered plain text; header formatting is reapplied from the offsets """
+    readable_offsets: list[tuple[int, int, int, int]] = field(default_factory=list)
+    """ (walk index, header length, body start, body end) for each readable section """
+    outline: list[dict[str, Any]] = field(default_factory=list)
+
+    def has_derived_state(self) -> bool:
+        return self.document_text != ""
+
+    def matches_disk(self) -> bool:
+        """True if the file is unchanged since the snapshot was taken."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        # Untouched file: skip hashing it
+        if stat.st_mtime == self.mtime and stat.st_size == self.size: return True
+        # Touched, but possibly with the same content
+        return file_digest(self.path) == self.sha256
+
+
+class SessionStore:
+    """ Reads and writes the session snapshot saved on exit """
+
+    def __init__(self, filepath: Path = SESSION_FILE):
+        self.filepath = filepath
+
+    def load(self) -> list[FileSnapshot]:
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return []
+
+        if data.get("version", None) != session_version: return []
+
+        snapshots = []
+        for entry in data.get("files", []):
+            try:
+                entry["readable_offsets"] = [tuple(offset) for offset in entry.get("readable_offsets", [])]
+                snapshots.append(FileSnapshot(**entry))
+            except TypeError:
+                continue
+        return snapshots
+
+    def save(self, snapshots: list[FileSnapshot]) -> None:
+        data = {"version": session_version, "files": [asdict(snapshot) for snapshot in snapshots]}
+        try:
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            # Write aside and swap, so a crash never leaves a half-written session
+            temp_path = self.filepath.with_suffix(".tmp")
+            with open(temp_path, "w", encoding="utf-8") as handle:
+                json.dump(data, handle)
+            os.replace(temp_path, self.filepath)
+        except OSError:
+            pass
+
+
+@dataclass
+class RestoredFile:
+    """ A session file as read back by SessionLoader """
+    snapshot: FileSnapshot
+    root: Element | None = None
+    validation_errors: list[str] = field(default_factory=list)
+    fingerprint: tuple[float, int, str] | None = None
+    current: bool = False
+    """ True if the snapshot's derived state still matches the file """
+    error: str | None = None
+
+
+class LoaderSignals(QObject):
+    finished = pyqtSignal(object)
+    """ Emitted with the RestoredFile """
+
+
+class SessionLoader(QRunnable):
+    """ Reads, hashes and parses the file of a session snapshot on a worker thread """
+
+    def __init__(self, snapshot: FileSnapshot):
+        super().__init__()
+        self.snapshot = snapshot
+        self.signals = LoaderSignals()
+
+    def run(self):
+        restored = RestoredFile(self.snapshot)
+        try:
+            restored.root, restored.validation_errors = parse_cscr(self.snapshot.path)
+        except (OSError, ParseError) as e:
+            restored.error = str(e)
+        else:
+            restored.fingerprint = file_fingerprint(self.snapshot.path)
+            restored.current = (self.snapshot.has_derived_state() and restored.fingerprint is not None
+                                and restored.fingerprint[2] == self.snapshot.sha256)
+        self.signals.finished.emit(restored)
@@ -0,0 +1,65 @@
+# ~/projects/contenta/editor/startup.py
+import sys
+import time
+from contextlib import contextmanager
+
+
+# Target time from process start to the first painted frame of the editor window
+FIRST_PAINT_BUDGET_MS = 400.0
+
+# Modules that should never be loaded before the first paint
+DEFERRED_MODULES = ("PyQt6.QtMultimedia", "PyQt6.QtMultimediaWidgets", "ui.clip_player")
+
+
+class StartupProfile:
+    """ Collects named timing phases for the startup path """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin: float = time.perf_counter()
+        self.phases: list[tuple[str, str, float]] = []
+        self.marks: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, kind: str, label: str):
+        """ Times the wrapped block as a phase of the given kind ("import" or "init") """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((kind, label, (time.perf_counter() - start) * 1000.0))
+
+    def mark(self, label: str):
+        """ Records a point in time relative to the start of the profile """
+        self.marks.setdefault(label, (time.perf_counter() - self.origin) * 1000.0)
+
+    def report(self, stream=None) -> str:
+        if stream is None:
+            stream = sys.stderr
+
+        lines = ["Contenta startup profile"]
+        for kind in ("import", "init"):
+            total = 0.0
+            lines.append(f"  {kind}:")
+            for phase_kind, label, elapsed in self.phases:
+                if phase_kind != kind: continue
+                total += elapsed
+                lines.append(f"    {label:<32} {elapsed:8.1f} ms")
+            lines.append(f"    {'total':<32} {total:8.1f} ms")
+
+        lines.append("  milestones:")
+        for label, elapsed in self.marks.items():
+            lines.append(f"    {label:<32} {elapsed:8.1f} ms")
+
+        first_paint = self.marks.get("first paint", None)
+        if first_paint is not None:
+            verdict = "within" if first_paint <= FIRST_PAINT_BUDGET_MS else "OVER"
+            lines.append(f"  first paint {verdict} budget of {FIRST_PAINT_BUDGET_MS:.0f} ms")
+
+        loaded = [module for module in DEFERRED_MODULES if module in sys.modules]
+        if loaded:
+            lines.append(f"  deferred modules loaded early: {', '.join(loaded)}")
+
+        text = "\n".join(lines)
+        print(text, file=stream)
+        return text
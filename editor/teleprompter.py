@@ -0,0 +1,197 @@
+# ~/projects/contenta/editor/teleprompter.py
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from PyQt6.QtCore import QObject, QTimer, QElapsedTimer, Qt, pyqtSignal
+
+from .cscr import CSCRTree
+from .pacing import DEFAULT_WORDS_PER_MINUTE, estimate_seconds
+from .text_area import TextArea
+
+
+# Time given to a header, or to a section with nothing to read
+HEADER_SECONDS = 1.5
+FRAME_INTERVAL_MS = 16
+# The line being read is held this far down the view
+READING_LINE_FRACTION = 1 / 3
+
+
+@dataclass(frozen=True)
+class ScheduledSection:
+    element_id: str
+    start: float
+    header_seconds: float
+    body_seconds: float
+
+    @property
+    def end(self) -> float:
+        return self.start + self.header_seconds + self.body_seconds
+
+
+def build_schedule(script: CSCRTree, text_area: TextArea,
+                   words_per_minute: int = DEFAULT_WORDS_PER_MINUTE) -> list[ScheduledSection]:
+    """Reading time of every rendered section, in document order, from its word count."""
+    schedule = []
+    clock = 0.0
+    for element_id in text_area.readable_offsets:
+        element = script.get_element(element_id)
+        if element is None: continue
+        header, body = script.get_readable(element)
+        body_seconds = estimate_seconds(body or "", words_per_minute)
+        header_seconds = HEADER_SECONDS if header or body_seconds == 0 else 0.0
+        schedule.append(ScheduledSection(element_id, clock, header_seconds, body_seconds))
+        clock += header_seconds + body_seconds
+    return schedule
+
+
+class Teleprompter(QObject):
+    """ Scrolls the text area through the script at reading pace.
+        Times and scroll positions are worked out once per layout; each frame only interpolates. """
+
+    section_changed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, text_area: TextArea, parent: QObject | None = None):
+        super().__init__(parent)
+        self.text_area = text_area
+        self.words_per_minute = DEFAULT_WORDS_PER_MINUTE
+        self.schedule: list[ScheduledSection] = []
+
+        # (time, scroll line) points to interpolate between, and the section each point starts
+        self.times: list[float] = []
+        self.lines: list[float] = []
+        self.point_sections: list[int] = []
+        self._layout_width = -1
+        self._lead_lines = 0
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self._tick)
+        self.clock = QElapsedTimer()
+        self.offset = 0.0
+        """ Script time when the clock was last (re)started """
+        self._point = 0
+        self._section = -1
+        self._value = -1
+        self._was_read_only = False
+        self.running = False
+        """ True from start to stop, paused or not """
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def is_paused(self) -> bool:
+        return self.running and not self.timer.isActive()
+
+    def start(self, script: CSCRTree, element_id: str | None = None) -> None:
+        self.stop()
+        self.schedule = build_schedule(script, self.text_area, self.words_per_minute)
+        if not self.schedule: return
+        self._build_table()
+        self._was_read_only = self.text_area.isReadOnly()
+        self.text_area.reading = True
+        self.text_area.setReadOnly(True)
+        self.running = True
+        self._section = -1
+        self.seek_to_section(element_id if element_id is not None else self.schedule[0].element_id)
+        self.timer.start()
+
+    def stop(self) -> None:
+        if not self.running: return
+        self.running = False
+        self.timer.stop()
+        self.text_area.reading = False
+        self.text_area.setReadOnly(self._was_read_only)
+
+    def pause(self) -> None:
+        if not self.timer.isActive(): return
+        self.offset = self.position()
+        self.timer.stop()
+
+    def resume(self) -> None:
+        if not self.is_paused(): return
+        self.clock.start()
+        self.timer.start()
+
+    def toggle_pause(self) -> None:
+        if self.is_paused():
+            self.resume()
+        else:
+            self.pause()
+
+    def position(self) -> float:
+        """Current script time in seconds."""
+        if not self.clock.isValid() or not self.timer.isActive():
+            return self.offset
+        return self.offset + self.clock.elapsed() / 1000
+
+    def seek_to_section(self, element_id: str) -> None:
+        for section in self.schedule:
+            if section.element_id == element_id:
+                self.seek(section.start)
+                return
+
+    def seek(self, seconds: float) -> None:
+        self.offset = seconds
+        self.clock.start()
+        # Seeking is the only time the table is searched; playback walks it forward
+        self._point = self._point_at(seconds)
+        self._value = -1
+        self._tick()
+
+    def _point_at(self, seconds: float) -> int:
+        return min(max(0, bisect_right(self.times, seconds) - 1), len(self.times) - 2)
+
+    def _line_of(self, position: int) -> float:
+        block = self.text_area.document().findBlock(position)
+        line = block.firstLineNumber()
+        layout = block.layout()
+        if layout is not None and layout.lineCount() > 0:
+            line += layout.lineForTextPosition(position - block.position()).lineNumber()
+        return float(line)
+
+    def _build_table(self) -> None:
+        """Maps the start of every header and body to a scroll position, for the current wrapping width."""
+        self.times, self.lines, self.point_sections = [], [], []
+        offsets = self.text_area.readable_offsets
+        for index, section in enumerate(self.schedule):
+            h_len, start, end = offsets[section.element_id]
+            self.times += [section.start, section.start + section.header_seconds]
+            self.lines += [self._line_of(start - h_len), self._line_of(start)]
+            self.point_sections += [index, index]
+        last = self.schedule[-1]
+        self.times.append(last.end)
+        self.lines.append(self._line_of(offsets[last.element_id][2]))
+        self.point_sections.append(len(self.schedule) - 1)
+
+        viewport = self.text_area.viewport()
+        self._layout_width = viewport.width()
+        self._lead_lines = int(viewport.height() / self.text_area.fontMetrics().lineSpacing() * READING_LINE_FRACTION)
+
+    def _tick(self) -> None:
+        if self.text_area.viewport().width() != self._layout_width:
+            # Rewrapped: scroll positions changed, the schedule did not
+            self._build_table()
+            self._point = self._point_at(self.position())
+
+        now = self.position()
+        while self._point + 1 < len(self.times) - 1 and self.times[self._point + 1] <= now:
+            self._point += 1
+
+        start_time, end_time = self.times[self._point], self.times[self._point + 1]
+        start_line, end_line = self.lines[self._point], self.lines[self._point + 1]
+        fraction = 1.0 if end_time <= start_time else min(1.0, max(0.0, (now - start_time) / (end_time - start_time)))
+        value = max(0, int(start_line + (end_line - start_line) * fraction) - self._lead_lines)
+        if value != self._value:
+            self._value = value
+            self.text_area.verticalScrollBar().setValue(value)
+
+        section = self.point_sections[self._point]
+        if section != self._section:
+            self._section = section
+            self.section_changed.emit(self.schedule[section].element_id)
+
+        if now >= self.times[-1] and self.running:
+            self.stop()
+            self.finished.emit()
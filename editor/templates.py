@@ -0,0 +1,98 @@
+# ~/projects/contenta/editor/templates.py
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from xml.etree.ElementTree import Element, ParseError
+
+from .cscr import parse_cscr, startup_prototype
+from .cscr_types import clone_element, param_pattern
+
+
+TEMPLATE_DIR = Path.home() / ".contenta" / "templates"
+DEFAULT_TEMPLATE = "Default"
+
+
+@dataclass(frozen=True)
+class ScriptTemplate:
+    """ A parsed template tree, copied (never re-parsed) for each new document """
+    name: str
+    prototype: Element
+    parameters: tuple[str, ...]
+    """ ${name} placeholders used in the template, in document order """
+    path: str | None = None
+    errors: tuple[str, ...] = ()
+
+    def instantiate(self, params: dict[str, str] | None = None) -> Element:
+        return clone_element(self.prototype, params)
+
+
+def find_parameters(root: Element) -> tuple[str, ...]:
+    found: dict[str, None] = {}
+    for element in root.iter():
+        for value in (element.text, *element.attrib.values()):
+            if value and "${" in value:
+                found.update(dict.fromkeys(param_pattern.findall(value)))
+    return tuple(found)
+
+
+def load_template(path: str) -> ScriptTemplate:
+    root, errors = parse_cscr(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return ScriptTemplate(name, root, find_parameters(root), path, tuple(errors))
+
+
+class TemplateLibrary:
+    """ Templates from the template directory, plus the built-in default.
+        Files are only re-parsed when their mtime or size changes. """
+
+    def __init__(self, directory: str | Path = TEMPLATE_DIR):
+        self.directory = Path(directory)
+        self.templates: dict[str, ScriptTemplate] = {}
+        # path -> (mtime_ns, size) of the file the template was parsed from
+        self._stamps: dict[str, tuple[int, int]] = {}
+        self.errors: dict[str, str] = {}
+        """ Files that could not be parsed, by path """
+
+        prototype, errors = startup_prototype()
+        self.default = ScriptTemplate(DEFAULT_TEMPLATE, prototype, find_parameters(prototype), errors=errors)
+
+    def refresh(self) -> None:
+        """Brings the index up to date with the template directory."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.name.endswith(".cscr") and entry.is_file()]
+        except OSError:
+            entries = []
+
+        stamps = {}
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        if stamps == self._stamps: return
+
+        by_path = {template.path: template for template in self.templates.values()}
+        templates = {}
+        self.errors = {}
+        for path, stamp in sorted(stamps.items()):
+            template = by_path.get(path, None)
+            if template is None or self._stamps.get(path, None) != stamp:
+                try:
+                    template = load_template(path)
+                except (ParseError, OSError) as e:
+                    self.errors[path] = str(e)
+                    continue
+            templates[template.name] = template
+        self.templates = templates
+        self._stamps = stamps
+
+    def names(self) -> list[str]:
+        self.refresh()
+        return [DEFAULT_TEMPLATE] + sorted(name for name in self.templates if name != DEFAULT_TEMPLATE)
+
+    def get(self, name: str) -> ScriptTemplate | None:
+        if name == DEFAULT_TEMPLATE: return self.default
+        self.refresh()
+        return self.templates.get(name, None)
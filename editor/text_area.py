@@ -1,19 +1,25 @@
 from typing import override
 
-from PyQt6.QtCore import pyqtSignal, pyqtSlot, QTimer
-from PyQt6.QtWidgets import QPlainTextEdit
+from PyQt6.QtCore import pyqtSignal, pyqtSlot, QTimer, QPoint
+from PyQt6.QtWidgets import QPlainTextEdit, QTextEdit
 from PyQt6.QtGui import (
     QFont, QTextOption, QTextCursor, QTextCharFormat, QColor
 )
 
 from ui.menus import HeaderContextMenu
 
-from editor.cscr import CSCRTree
+from editor.cscr import CSCRTree, ChangeKind, ElementChange
+from editor.paste import ChunkedInserter, LARGE_PASTE_THRESHOLD
+from editor.analysis import TextMetrics
 
 
 class TextArea(QPlainTextEdit):
     script_updated = pyqtSignal(str, str)
     header_selected = pyqtSignal(str)
+    section_entered = pyqtSignal(str)
+    """ Emitted with the element id when the cursor moves into a different section """
+    large_paste = pyqtSignal(str, str)
+    """ Emitted with the element id and its whole body once a large paste has been inserted """
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -21,7 +27,6 @@ class TextArea(QPlainTextEdit):
 
         self.setWordWrapMode(
             QTextOption.WrapMode.WordWrap)  # QTextOption.WordWrap (Wrap at word boundaries)
-        self.setFont(QFont("VT323", 14, weight=QFont.Weight.Black))  # Monospace font
         self.setLineWidth(80)  # Approximate 80-character width
 
         self.debouncer = QTimer()
@@ -38,9 +43,37 @@ class TextArea(QPlainTextEdit):
         self.select_header_back: QColor = QColor(20, 20, 100, 255)
 
         self.section_element: str = ""
+        # Set while a read-through runs; moving the cursor must not make the text editable
+        self.reading = False
         self.section_selected: tuple[int, int, int] | None = None
-
-        self.header_context_menu = HeaderContextMenu(self)
+        # Set while our own edits are written back, so their change events are not re-rendered
+        self._committing = False
+
+        self._header_context_menu: HeaderContextMenu | None = None
+        self.paste_inserter: ChunkedInserter | None = None
+        # Latest analysis results, drawn as decorations over each section body
+        self.section_metrics: dict[str, TextMetrics] = {}
+        self.section_selections: dict[str, list[QTextEdit.ExtraSelection]] = {}
+        self.repeat_color: QColor = QColor(255, 170, 60, 255)
+        self.repeat_format = QTextCharFormat()
+        self.repeat_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.WaveUnderline)
+        self.repeat_format.setUnderlineColor(self.repeat_color)
+        # Results arrive one section at a time; the decorations are set once per batch
+        self.decoration_timer = QTimer(self)
+        self.decoration_timer.setSingleShot(True)
+        self.decoration_timer.setInterval(0)
+        self.decoration_timer.timeout.connect(self.update_decorations)
+
+    @property
+    def header_context_menu(self) -> HeaderContextMenu:
+        # Built on first right-click rather than at startup
+        if self._header_context_menu is None:
+            self._header_context_menu = HeaderContextMenu(self)
+        return self._header_context_menu
+
+    def apply_editor_font(self):
+        """Loads the editor font; deferred until after the first paint."""
+        self.setFont(QFont("VT323", 14, weight=QFont.Weight.Black))  # Monospace font
 
     @override
     def focusInEvent(self, e):
@@ -49,6 +82,8 @@ class TextArea(QPlainTextEdit):
 
     @override
     def focusOutEvent(self, e):
+        # Typing still waiting on the debouncer can't be placed once the cursor position is forgotten
+        self.commit_pending()
         self.last_cursor_pos = None
         super().focusOutEvent(e)
 
@@ -64,12 +99,69 @@ class TextArea(QPlainTextEdit):
             self.update_cursor()
         super().keyPressEvent(e)
         
+    @override
+    def insertFromMimeData(self, source):
+        text = source.text() if source.hasText() else ""
+        if len(text) < LARGE_PASTE_THRESHOLD or self.section_element == "" or self.isReadOnly():
+            super().insertFromMimeData(source)
+            return
+        self.paste_large(text)
+
+    def paste_large(self, text: str):
+        """Inserts a long paste in chunks, then hands the whole section body over in one go."""
+        if self.paste_inserter is not None: return
+        element_id = self.section_element
+
+        # Drop the selection the paste replaces, but never past the section body
+        h_len, body_start, body_end = self.readable_offsets[element_id]
+        cursor = self.textCursor()
+        if cursor.hasSelection():
+            sel_start = min(max(cursor.selectionStart(), body_start), body_end)
+            sel_end = min(max(cursor.selectionEnd(), body_start), body_end)
+            cursor.setPosition(sel_start)
+            cursor.setPosition(sel_end, QTextCursor.MoveMode.KeepAnchor)
+            removed = sel_end - sel_start
+            self.blockSignals(True)
+            cursor.removeSelectedText()
+            self.blockSignals(False)
+            self.shift_offsets(element_id, -removed)
+        position = cursor.position()
+
+        self.setReadOnly(True)
+        self.paste_inserter = ChunkedInserter(self, position, text.replace("\r\n", "\n"))
+        self.paste_inserter.finished.connect(lambda start, end: self.finish_large_paste(element_id, end - start))
+        self.paste_inserter.start()
+
+    def finish_large_paste(self, element_id: str, inserted: int):
+        self.paste_inserter.deleteLater()
+        self.paste_inserter = None
+        self.setReadOnly(self.reading)
+        self.debouncer.stop()
+
+        self.shift_offsets(element_id, inserted)
+        self.last_cursor_pos = self.textCursor().position()
+        h_len, start, end = self.readable_offsets[element_id]
+        self._committing = True
+        try:
+            self.large_paste.emit(element_id, self.toPlainText()[start:end].strip('\n'))
+        finally:
+            self._committing = False
+
+    def shift_offsets(self, element_id: str, delta: int):
+        """Grows (or shrinks) a section's body by delta and moves the sections after it."""
+        h_len, start, end = self.readable_offsets[element_id]
+        self.readable_offsets[element_id] = (h_len, start, end + delta)
+        for other_id, (o_h_len, o_start, o_end) in self.readable_offsets.items():
+            if other_id != element_id and o_start - o_h_len >= end:
+                self.readable_offsets[other_id] = (o_h_len, o_start + delta, o_end + delta)
+
     @override
     def contextMenuEvent(self, e):
         if self.section_selected is not None:
             self.header_context_menu.exec(e.globalPos(), self.section_element)
 
     def update_cursor(self):
+        previous_section = self.section_element
         self.last_cursor_pos = self.textCursor().position()
         if self.section_selected is not None:
             self.highlight_section(self.section_selected, (self.default_header_fore, self.default_header_back))
@@ -87,7 +179,8 @@ class TextArea(QPlainTextEdit):
                         self.header_selected.emit(ele_id)
                     else:
                         # print("body")
-                        self.setReadOnly(False)
+                        # A chunked paste still owns the offsets until finish_large_paste
+                        self.setReadOnly(self.reading or self.paste_inserter is not None)
                     break
                 else:
                     self.section_element = ""
@@ -95,6 +188,9 @@ class TextArea(QPlainTextEdit):
             except TypeError:
                 print(ele_id)
 
+        if self.section_element != "" and self.section_element != previous_section:
+            self.section_entered.emit(self.section_element)
+
     def seek_to_element(self, element_id):
         element = self.readable_offsets.get(element_id, None)
         if element is None: return
@@ -116,11 +212,15 @@ class TextArea(QPlainTextEdit):
         self.blockSignals(True)
 
         self.clear()
+        self.readable_offsets.clear()
+        self.section_metrics.clear()
+        self.section_selections.clear()
+        self.setExtraSelections([])
         readable_buffer: str = ""
         pos = 0
 
         for element_id, element in script.index_tree().items():
-            header, body = CSCRTree.get_readable(element)
+            header, body = script.get_readable(element)
             if header is not None: head_len = len(header)
             else: head_len = 0
             if body is not None: body_len = len(body)
@@ -138,6 +238,147 @@ class TextArea(QPlainTextEdit):
 
         self.blockSignals(False)
 
+    def apply_changes(self, script: CSCRTree, changes: list[ElementChange]):
+        """Updates the rendered script from a batch of tree changes."""
+        structural = any(
+            change.kind in (ChangeKind.INSERTED, ChangeKind.REMOVED, ChangeKind.MOVED)
+            or change.attribute == "readable"
+            for change in changes
+        )
+        if structural:
+            cursor_pos, scroll = self.capture_view()
+            self.render_script(script)
+            self.restore_view(cursor_pos, scroll)
+            return
+
+        if self._committing: return
+        # A section can appear several times in a batch (text and header); render it once,
+        # and lay the document out once for the whole batch
+        element_ids = dict.fromkeys(change.element_id for change in changes
+                                    if change.element_id in self.readable_offsets)
+        if not element_ids: return
+        batch = QTextCursor(self.document())
+        batch.beginEditBlock()
+        for element_id in element_ids:
+            self.rerender_section(script, element_id)
+        # Closing the block reports the whole edit at once; it is already in the tree
+        self.blockSignals(True)
+        batch.endEditBlock()
+        self.blockSignals(False)
+
+    def rerender_section(self, script: CSCRTree, element_id: str):
+        """Re-renders one section in place and shifts the sections after it."""
+        offset = self.readable_offsets.get(element_id, None)
+        element = script.get_element(element_id)
+        if offset is None or element is None: return
+
+        header, body = script.get_readable(element)
+        header = header or ""
+        body = body or ""
+        h_len, start, end = offset
+        section_start = start - h_len
+        delta = len(header) + len(body) - (end - section_start)
+
+        self.blockSignals(True)
+
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(section_start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(f"{header}{body}", QTextCharFormat())
+
+        # Shift the sections after this one, then settle this one's new layout
+        self.shift_offsets(element_id, delta)
+        new_offset = (len(header), section_start + len(header), section_start + len(header) + len(body))
+        self.readable_offsets[element_id] = new_offset
+        self.apply_formatting({element_id: new_offset})
+        if self.section_element == element_id:
+            self.section_selected = None
+        # Replacing the text collapsed the old decoration cursors
+        self.refresh_decorations(element_id)
+
+        self.blockSignals(False)
+
+    def restore_render(self, text: str, offsets: dict[str, tuple[int, int, int]]):
+        """Restores a previously rendered script without rendering its elements again."""
+        self.blockSignals(True)
+
+        self.setPlainText(text)
+        self.readable_offsets = dict(offsets)
+        self.apply_formatting(self.readable_offsets)
+        self.section_metrics.clear()
+        self.section_selections.clear()
+        self.setExtraSelections([])
+
+        self.blockSignals(False)
+
+    def capture_view(self) -> tuple[int, int]:
+        """Returns the cursor position and scroll value of the editor."""
+        return self.textCursor().position(), self.verticalScrollBar().value()
+
+    def restore_view(self, cursor_pos: int, scroll: int):
+        cursor = self.textCursor()
+        cursor.setPosition(max(0, min(cursor_pos, self.document().characterCount() - 1)))
+        self.setTextCursor(cursor)
+        self.verticalScrollBar().setValue(scroll)
+
+    def visible_sections(self) -> set[str]:
+        """Ids of the sections that currently intersect the viewport."""
+        viewport = self.viewport().rect()
+        top = self.cursorForPosition(viewport.topLeft()).position()
+        bottom = self.cursorForPosition(viewport.bottomRight() - QPoint(1, 1)).position()
+        return {
+            element_id for element_id, (h_len, start, end) in self.readable_offsets.items()
+            if start - h_len <= bottom and end >= top
+        }
+
+    def section_body(self, element_id: str) -> str:
+        """The body text of a section exactly as rendered, so offsets into it are document offsets."""
+        h_len, start, end = self.readable_offsets[element_id]
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        # Qt hands blocks back joined by U+2029; one character either way, so offsets hold
+        return cursor.selectedText().replace("\u2029", "\n")
+
+    def set_section_metrics(self, element_id: str, metrics: TextMetrics | None):
+        """Stores analysis results for a section and redraws its repeated-word decorations."""
+        if metrics is None:
+            self.section_metrics.pop(element_id, None)
+        elif metrics is self.section_metrics.get(element_id, None) and element_id in self.section_selections:
+            return
+        else:
+            self.section_metrics[element_id] = metrics
+        self.refresh_decorations(element_id)
+
+    def refresh_decorations(self, element_id: str):
+        """Rebuilds one section's decorations; they are handed to Qt once the current batch is done."""
+        if element_id in self.section_metrics:
+            self.section_selections[element_id] = self._section_selections(element_id)
+        elif self.section_selections.pop(element_id, None) is None:
+            return
+        self.decoration_timer.start()
+
+    def _section_selections(self, element_id: str) -> list[QTextEdit.ExtraSelection]:
+        offset = self.readable_offsets.get(element_id, None)
+        if offset is None: return []
+        h_len, start, end = offset
+
+        selections = []
+        for span_start, span_end in self.section_metrics[element_id].repeated_spans:
+            if start + span_end > end: break
+            selection = QTextEdit.ExtraSelection()
+            # The cursors follow later edits, so cached selections stay in place as text shifts
+            selection.cursor = QTextCursor(self.document())
+            selection.cursor.setPosition(start + span_start)
+            selection.cursor.setPosition(start + span_end, QTextCursor.MoveMode.KeepAnchor)
+            selection.format = self.repeat_format
+            selections.append(selection)
+        return selections
+
+    def update_decorations(self):
+        self.setExtraSelections([selection for selections in self.section_selections.values()
+                                 for selection in selections])
+
     def highlight_section(self, offset: tuple[int, int, int], header_color: tuple[QColor, QColor], body_color: tuple[QColor, QColor] = (None, None)):
         cursor = QTextCursor(self.document())
         fmt_header = cursor.charFormat()
@@ -174,6 +415,12 @@ class TextArea(QPlainTextEdit):
             cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.KeepAnchor, header_len)
             cursor.mergeCharFormat(fmt_header)
 
+    def commit_pending(self):
+        """Writes typing still waiting on the debouncer into the tree."""
+        if self.debouncer.isActive():
+            self.debouncer.stop()
+            self.text_changed()
+
     @pyqtSlot()
     def text_changed(self):
         cur_cursor_pos = self.textCursor().position()
@@ -205,4 +452,11 @@ class TextArea(QPlainTextEdit):
 
         self.last_cursor_pos = cur_cursor_pos
         """Emit the new text buffer."""
-        self.script_updated.emit(changed_element, self.toPlainText()[c_off_s:c_off_e].strip('\n'))
+        # Decorations of the edited section are stale until it is analysed again
+        if changed_element in self.section_metrics:
+            self.set_section_metrics(changed_element, None)
+        self._committing = True
+        try:
+            self.script_updated.emit(changed_element, self.toPlainText()[c_off_s:c_off_e].strip('\n'))
+        finally:
+            self._committing = False
@@ -1,18 +1,90 @@
 # ~/projects/contenta/main.py
+import argparse
+import sys
 
-from PyQt6.QtWidgets import QApplication
+from editor.startup import StartupProfile
 
-from editor.editor_window import EditorWindow
 
-import sys
+def parse_args(argv: list[str]) -> tuple[argparse.Namespace, list[str]]:
+    parser = argparse.ArgumentParser(prog="contenta", description="Video essay script editor")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report an import-time and init-time breakdown of the startup path")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                        help="print the element-level differences between two .cscr files")
+    parser.add_argument("--merge-driver", nargs=3, metavar=("BASE", "OURS", "THEIRS"),
+                        help="git merge driver: three-way merge of .cscr files into OURS")
+    parser.add_argument("--export", nargs="+", metavar=("FORMAT", "FILE"),
+                        help="export .cscr files without opening the editor (md, txt, srt, vtt)")
+    parser.add_argument("--output-dir", help="directory for exported files (default: next to each script)")
+    parser.add_argument("--memory-report", nargs="+", metavar="FILE",
+                        help="report the memory each .cscr file takes once loaded, per subsystem and per section")
+    parser.add_argument("--jobs", type=int, default=None, help="number of scripts to export in parallel")
+    # Anything we don't know about is handed to Qt (-platform, -style, ...)
+    return parser.parse_known_args(argv[1:])
+
+def run_headless(args: argparse.Namespace) -> int | None:
+    """Runs a command-line tool without starting the GUI; None if no tool was requested."""
+    if args.diff:
+        from editor.cscr_diff import diff_files
+        for op in diff_files(*args.diff):
+            print(op.describe())
+        return 0
+    if args.merge_driver:
+        from editor.cscr_diff import merge_driver
+        return merge_driver(*args.merge_driver)
+    if args.export:
+        from editor.exporters import exporters, export_files
+        format_name, filepaths = args.export[0], args.export[1:]
+        if format_name not in exporters or not filepaths:
+            print(f"usage: --export {{{','.join(exporters)}}} FILE [FILE ...]", file=sys.stderr)
+            return 2
+        try:
+            results = export_files(filepaths, format_name, args.output_dir, args.jobs)
+        except OSError as e:
+            print(f"contenta: cannot create output directory: {e}", file=sys.stderr)
+            return 1
+        for result in results:
+            if result.error is None:
+                print(result.target_path)
+            else:
+                print(f"contenta: {result.source_path}: {result.error}", file=sys.stderr)
+        return 1 if any(result.error is not None for result in results) else 0
+    if args.memory_report:
+        from editor.memory import file_report
+        for filepath in args.memory_report:
+            print(f"{filepath}\n{file_report(filepath).summary()}\n")
+        return 0
+    return None
 
 def main():
+    args, qt_args = parse_args(sys.argv)
+    status = run_headless(args)
+    if status is not None:
+        sys.exit(status)
+
+    profile = StartupProfile(args.profile_startup)
+
+    # Keep heavy imports out of module scope so they can be timed
+    with profile.phase("import", "PyQt6.QtWidgets"):
+        from PyQt6.QtWidgets import QApplication
+    with profile.phase("import", "editor.editor_window"):
+        from editor.editor_window import EditorWindow
+
     # Create the application
-    app = QApplication(sys.argv)
+    with profile.phase("init", "QApplication"):
+        app = QApplication(sys.argv[:1] + qt_args)
 
     # Create and show the text editor
-    editor = EditorWindow()
-    editor.show()
+    with profile.phase("init", "EditorWindow"):
+        editor = EditorWindow()
+    with profile.phase("init", "show"):
+        editor.show()
+
+    if profile.enabled:
+        editor.first_painted.connect(lambda: profile.mark("first paint"))
+        editor.startup_finished.connect(lambda: profile.mark("document ready"))
+        editor.startup_finished.connect(lambda: profile.report())
+
     sys.exit(app.exec())
 
 if __name__ == "__main__":
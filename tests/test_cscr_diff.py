@@ -0,0 +1,161 @@
+# ~/projects/contenta/tests/test_cscr_diff.py
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+from editor.changes import ChangeKind
+from editor.cscr_diff import diff_trees, merge_driver, merge_files, merge_trees
+
+
+def tree(body: str) -> ET.Element:
+    return ET.fromstring(f'<cscr version="1.0"><title>T</title>{body}</cscr>')
+
+
+def sections(root: ET.Element) -> list[tuple[str, str | None, str | None]]:
+    return [(child.tag, child.get("desc"), child.text) for child in root if child.tag != "title"]
+
+
+BASE = '<monologue id="a" desc="A">one</monologue><monologue id="b" desc="B">two</monologue>'
+
+
+def test_edits_to_different_elements_merge_cleanly():
+    ours = tree('<monologue id="a" desc="A">one, edited</monologue><monologue id="b" desc="B">two</monologue>')
+    theirs = tree('<monologue id="a" desc="A">one</monologue><monologue id="b" desc="B2">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 0
+    assert sections(merged) == [("monologue", "A", "one, edited"), ("monologue", "B2", "two")]
+
+
+def test_both_editing_the_text_is_a_conflict():
+    ours = tree('<monologue id="a" desc="A">ours</monologue><monologue id="b" desc="B">two</monologue>')
+    theirs = tree('<monologue id="a" desc="A">theirs</monologue><monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 1
+    conflict = merged.find("conflict")
+    assert conflict.get("desc") == "both edited the text"
+    assert conflict.find("ours/monologue").text == "ours"
+    assert conflict.find("theirs/monologue").text == "theirs"
+    # The untouched sibling is kept as it was
+    assert merged.find("monologue").get("id") == "b"
+
+
+def test_both_changing_an_attribute_is_a_conflict():
+    ours = tree('<monologue id="a" desc="X">one</monologue><monologue id="b" desc="B">two</monologue>')
+    theirs = tree('<monologue id="a" desc="Y">one</monologue><monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 1
+    assert merged.find("conflict").get("desc") == "both changed 'desc'"
+
+
+def test_edit_against_delete_is_a_conflict():
+    ours = tree('<monologue id="a" desc="A">one, edited</monologue><monologue id="b" desc="B">two</monologue>')
+    theirs = tree('<monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 1
+    conflict = merged.find("conflict")
+    assert conflict.get("desc") == "edited here, deleted there"
+    assert len(conflict.find("theirs")) == 0
+
+
+def test_untouched_element_deleted_on_one_side_stays_deleted():
+    theirs = tree('<monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), tree(BASE), theirs)
+    assert conflicts == 0
+    assert sections(merged) == [("monologue", "B", "two")]
+
+
+def test_additions_on_both_sides_are_kept_in_place():
+    ours = tree(BASE + '<monologue id="c" desc="C">ours</monologue>')
+    theirs = tree('<monologue id="a" desc="A">one</monologue><transition id="t" desc="Cut"/>'
+                  '<monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 0
+    assert [child.get("id") for child in merged if child.tag != "title"] == ["a", "t", "b", "c"]
+
+
+def test_same_element_added_on_both_sides_is_kept_once():
+    added = '<monologue id="c" desc="C">new</monologue>'
+    merged, conflicts = merge_trees(tree(BASE), tree(BASE + added), tree(BASE + added))
+    assert conflicts == 0
+    assert [child.get("id") for child in merged if child.tag != "title"] == ["a", "b", "c"]
+
+
+def test_different_elements_added_under_one_id_is_a_conflict():
+    merged, conflicts = merge_trees(tree(BASE), tree(BASE + '<monologue id="c">ours</monologue>'),
+                                    tree(BASE + '<monologue id="c">theirs</monologue>'))
+    assert conflicts == 1
+    assert merged.find("conflict").get("desc") == "both added"
+
+
+def test_their_reorder_is_followed_when_ours_kept_the_order():
+    theirs = tree('<monologue id="b" desc="B">two</monologue><monologue id="a" desc="A">one</monologue>')
+    ours = tree('<monologue id="a" desc="A">one, edited</monologue><monologue id="b" desc="B">two</monologue>')
+    merged, conflicts = merge_trees(tree(BASE), ours, theirs)
+    assert conflicts == 0
+    assert sections(merged) == [("monologue", "B", "two"), ("monologue", "A", "one, edited")]
+
+
+def test_ids_gained_on_one_side_do_not_cause_conflicts():
+    # A file saved before ids existed, merged with a copy the editor has since given ids
+    base = tree('<monologue desc="A">one</monologue><monologue desc="B">two</monologue>')
+    ours = tree('<monologue id="monologue-0000aaaa" desc="A">one</monologue>'
+                '<monologue id="monologue-0000bbbb" desc="B">two</monologue>'
+                '<monologue id="monologue-0000cccc" desc="C">new</monologue>')
+    theirs = tree('<monologue desc="A">one, edited</monologue><monologue desc="B">two</monologue>')
+    merged, conflicts = merge_trees(base, ours, theirs)
+    assert conflicts == 0
+    assert sections(merged) == [("monologue", "A", "one, edited"), ("monologue", "B", "two"),
+                                ("monologue", "C", "new")]
+
+
+def test_ids_added_on_both_sides_keep_ours():
+    base = tree('<monologue desc="A">one</monologue>')
+    ours = tree('<monologue id="monologue-0000aaaa" desc="A">one</monologue>')
+    theirs = tree('<monologue id="monologue-1111aaaa" desc="A">one</monologue>')
+    merged, conflicts = merge_trees(base, ours, theirs)
+    assert conflicts == 0
+    assert merged.find("monologue").get("id") == "monologue-0000aaaa"
+
+
+def test_conflict_at_the_root_keeps_the_document_root():
+    base = ET.fromstring('<cscr version="1.0">x</cscr>')
+    merged, conflicts = merge_trees(base, ET.fromstring('<cscr version="1.0">y</cscr>'),
+                                    ET.fromstring('<cscr version="1.0">z</cscr>'))
+    assert conflicts == 1
+    assert merged.tag == "cscr"
+    assert [child.tag for child in merged] == ["conflict"]
+
+
+def test_diff_reports_moves_edits_and_inserts():
+    new = tree('<monologue id="b" desc="B">two</monologue><monologue id="a" desc="A">one!</monologue>'
+               '<monologue id="c" desc="C">three</monologue>')
+    ops = diff_trees(tree(BASE), new)
+    assert [op.key for op in ops if op.kind is ChangeKind.TEXT_CHANGED] == ["monologue#a"]
+    assert [op.element.get("id") for op in ops if op.kind is ChangeKind.INSERTED] == ["c"]
+    assert len([op for op in ops if op.kind is ChangeKind.MOVED]) == 1
+
+
+def test_diff_of_identical_trees_is_empty():
+    assert diff_trees(tree(BASE), tree(BASE)) == []
+
+
+def test_merge_files_and_driver(tmp_path):
+    paths = {}
+    for side, body in (("base", BASE),
+                       ("ours", BASE.replace(">one<", ">ours<")),
+                       ("theirs", BASE.replace(">one<", ">theirs<"))):
+        paths[side] = tmp_path / f"{side}.cscr"
+        ET.ElementTree(tree(body)).write(paths[side], encoding="utf-8")
+
+    output = tmp_path / "merged.cscr"
+    assert merge_files(str(paths["base"]), str(paths["ours"]), str(paths["theirs"]), str(output)) == 1
+    assert ET.parse(output).getroot().find("conflict") is not None
+
+    assert merge_driver(str(paths["base"]), str(paths["base"]), str(paths["theirs"])) == 0
+    assert ET.parse(paths["base"]).getroot().find("monologue").text == "theirs"
+
+
+def test_merge_driver_does_not_load_qt():
+    code = "import sys, editor.cscr_diff; print('PyQt6' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,98 @@
+# ~/projects/contenta/tests/test_exporters.py
+import io
+import os
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from editor.cscr import parse_cscr
+from editor.exporters import (ScriptExporter, Section, export_file, export_files, export_targets, exporters,
+                              iter_file_sections, iter_sections)
+
+SCRIPT = """<cscr version="1.0"><title>T</title>
+<monologue desc="Intro" readable="_tag_desc_body">Hello there, welcome back. This is the first section.</monologue>
+<transition desc="Cut" readable="_tag_desc"/>
+<monologue desc="Outro" readable="_desc_body">Goodbye.</monologue>
+</cscr>"""
+
+
+@pytest.fixture
+def script_path(tmp_path):
+    path = tmp_path / "script.cscr"
+    path.write_text(SCRIPT, encoding="utf-8")
+    return str(path)
+
+
+def test_streamed_sections_match_the_parsed_tree(script_path):
+    root, _ = parse_cscr(script_path)
+    assert list(iter_file_sections(script_path)) == list(iter_sections(root))
+    assert [section.header for section in iter_sections(root)] == ["Monologue - Intro", "Transition - Cut", "Outro"]
+
+
+def test_base_exporter_writes_plain_text():
+    handle = io.StringIO()
+    ScriptExporter().export([Section("monologue", "Intro", "Hello"), Section("transition", "Cut", "")], handle)
+    assert handle.getvalue() == "Intro\n\nHello\n\nCut\n\n"
+
+
+def test_markdown_export(script_path, tmp_path):
+    target = str(tmp_path / "script.md")
+    result = export_file(script_path, "md", target)
+    assert result.error is None
+    with open(target, encoding="utf-8") as handle:
+        text = handle.read()
+    assert text.startswith("## Monologue - Intro\n\nHello there, welcome back.")
+    assert "## Outro\n\nGoodbye.\n\n" in text
+
+
+@pytest.mark.parametrize("format_name, separator", [("srt", ","), ("vtt", ".")])
+def test_subtitle_cues_follow_on(script_path, tmp_path, format_name, separator):
+    target = str(tmp_path / f"script.{format_name}")
+    assert export_file(script_path, format_name, target).error is None
+    with open(target, encoding="utf-8") as handle:
+        text = handle.read()
+    assert text.startswith("WEBVTT\n\n1\n" if format_name == "vtt" else "1\n")
+    # Cues are numbered on across sections, and each starts where the last one ended
+    timings = [line.split(" --> ") for line in text.splitlines() if " --> " in line]
+    assert len(timings) == 3
+    assert timings[0][0] == f"00:00:00{separator}000"
+    assert all(previous[1] == current[0] for previous, current in zip(timings, timings[1:]))
+
+
+def test_failed_export_reports_and_leaves_nothing(tmp_path):
+    source = tmp_path / "broken.cscr"
+    source.write_text("<cscr><monologue>", encoding="utf-8")
+    target = str(tmp_path / "broken.md")
+    result = export_file(str(source), "md", target)
+    assert result.error is not None
+    assert not os.path.exists(target)
+
+    missing = export_file(str(tmp_path / "missing.cscr"), "md", target)
+    assert missing.error is not None
+    assert not os.path.exists(target)
+
+
+def test_targets_sit_next_to_their_scripts():
+    assert export_targets(["/a/intro.cscr", "/b/outro.cscr"], "txt") == ["/a/intro.txt", "/b/outro.txt"]
+
+
+def test_clashing_targets_get_their_folder_name():
+    sources = ["/x/a/intro.cscr", "/x/b/intro.cscr", "/x/a/outro.cscr"]
+    assert export_targets(sources, "md", "/out") == ["/out/a-intro.md", "/out/b-intro.md", "/out/outro.md"]
+
+
+def test_clashing_folder_names_are_numbered():
+    sources = ["/x/a/intro.cscr", "/y/a/intro.cscr"]
+    assert export_targets(sources, "md", "/out") == ["/out/a-intro.md", "/out/a-intro-2.md"]
+
+
+def test_export_files_creates_the_output_folder(script_path, tmp_path):
+    output_dir = str(tmp_path / "exports" / "md")
+    results = export_files([script_path], "md", output_dir)
+    assert [result.error for result in results] == [None]
+    assert os.path.exists(os.path.join(output_dir, "script.md"))
+
+
+def test_every_format_is_registered():
+    assert set(exporters) == {"md", "txt", "srt", "vtt"}
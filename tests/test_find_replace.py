@@ -0,0 +1,93 @@
+# ~/projects/contenta/tests/test_find_replace.py
+import re
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+import editor.find_replace as find_replace
+from editor.cscr import CSCRTree, parse_cscr
+from editor.find_replace import FindQuery, find_in_tree, plan_replace, replace_in_tree
+
+SCRIPT = """<cscr version="1.0"><title>cat</title>
+<monologue desc="The cat" readable="_tag_desc_body">A cat sat.</monologue>
+<monologue desc="cat notes" readable="_tag_body">Cat and cat.</monologue>
+<clip start="0" end="10">cat clip</clip>
+</cscr>"""
+
+
+@pytest.fixture
+def script():
+    root, errors = parse_cscr(SCRIPT, from_string=True)
+    assert errors == []
+    return CSCRTree(root=root)
+
+
+def bodies(script: CSCRTree) -> list[str | None]:
+    return [element.text for element in script.root.iter("monologue")]
+
+
+def test_only_readable_fields_are_searched(script):
+    preview = find_in_tree(script, FindQuery("cat"))
+    # The title, the clip and the desc of the body-only section are never shown, so never matched
+    assert sorted((match.field, match.count) for match in preview.matches) == \
+        [("content", 1), ("content", 2), ("desc", 1)]
+    assert preview.summary() == "4 matches in 2 elements"
+
+
+def test_case_and_whole_word_options(script):
+    assert find_in_tree(script, FindQuery("Cat", case_sensitive=True)).total == 1
+    assert find_in_tree(script, FindQuery("ca", whole_word=True)).total == 0
+    assert find_in_tree(script, FindQuery(r"c.t", regex=True)).total == 4
+
+
+def test_invalid_regex_raises(script):
+    with pytest.raises(re.error):
+        find_in_tree(script, FindQuery("(", regex=True))
+
+
+def test_replace_all(script):
+    assert replace_in_tree(script, FindQuery("cat"), "dog") == 4
+    assert bodies(script) == ["A dog sat.", "dog and dog."]
+    assert script.root.find("title").text == "cat"
+    assert script.root.find("monologue").get("desc") == "The dog"
+
+
+def test_literal_replacement_keeps_backslashes(script):
+    replace_in_tree(script, FindQuery("sat"), r"\1 \g<0>")
+    assert bodies(script)[0] == r"A cat \1 \g<0>."
+
+
+def test_regex_replacement_expands_groups(script):
+    replace_in_tree(script, FindQuery(r"(\w+) sat", regex=True), r"sat \1")
+    assert bodies(script)[0] == "A sat cat."
+
+
+def test_replace_applies_as_one_batch(script):
+    batches = []
+    script.elements_changed.connect(batches.append)
+    replace_in_tree(script, FindQuery("cat"), "dog")
+    assert len(batches) == 1
+
+
+def test_plan_skips_fields_edited_since_it_was_made(script):
+    plan = plan_replace(script, FindQuery("cat"), "dog")
+    results = plan.compute()
+    edited = script.element_key(script.root.find("monologue"))
+    script.set_property(edited, "content", "A cat ran.")
+    # Only the edited body is left alone; its desc and the other section are replaced
+    assert plan.apply(script, results) == 3
+    assert bodies(script) == ["A cat ran.", "dog and dog."]
+    assert script.root.find("monologue").get("desc") == "The dog"
+
+
+def test_worker_processes_give_the_same_result(script, monkeypatch):
+    monkeypatch.setattr(find_replace, "PARALLEL_THRESHOLD", 0)
+    monkeypatch.setattr(find_replace, "CHUNK_CHARS", 1)
+    try:
+        assert find_in_tree(script, FindQuery("cat"), jobs=2).total == 4
+        assert replace_in_tree(script, FindQuery("cat"), "dog", jobs=2) == 4
+        assert find_replace._pool is not None
+    finally:
+        find_replace.shutdown_pool()
+    assert bodies(script) == ["A dog sat.", "dog and dog."]
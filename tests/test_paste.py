@@ -0,0 +1,63 @@
+# ~/projects/contenta/tests/test_paste.py
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from editor.paste import split_sections
+
+
+def test_empty_or_blank_text_makes_no_sections():
+    assert split_sections("") == []
+    assert split_sections("\n\n  \n\n") == []
+
+
+def test_text_without_headings_is_one_section():
+    assert split_sections("one\n\ntwo") == [("", "one\n\ntwo")]
+
+
+def test_sections_start_at_headings():
+    text = "# Intro\n\nHello\n\n## Middle ##\n\nThere\n\nagain"
+    assert split_sections(text) == [("Intro", "Hello"), ("Middle", "There\n\nagain")]
+
+
+def test_text_before_the_first_heading_keeps_no_description():
+    assert split_sections("lead\n\n# Title\n\nbody") == [("", "lead"), ("Title", "body")]
+
+
+def test_heading_with_nothing_under_it_is_an_empty_section():
+    assert split_sections("# Only") == [("Only", "")]
+    assert split_sections("# A\n\n# B\n\nbody") == [("A", ""), ("B", "body")]
+
+
+def test_body_on_the_line_after_a_heading():
+    assert split_sections("# Title\nfirst line\n\nnext") == [("Title", "first line\n\nnext")]
+
+
+def test_heading_marks_inside_a_paragraph_are_text():
+    assert split_sections("one\n# not a heading") == [("", "one\n# not a heading")]
+
+
+def test_long_sections_split_at_paragraphs():
+    text = "\n\n".join(["# Part", "a" * 10, "b" * 10, "c" * 10])
+    assert split_sections(text, max_chars=15) == [("Part", "a" * 10), ("Part (2)", "b" * 10),
+                                                  ("Part (3)", "c" * 10)]
+
+
+def test_split_without_a_heading_is_numbered_from_pasted():
+    text = "\n\n".join(["a" * 10, "b" * 10])
+    assert split_sections(text, max_chars=15) == [("", "a" * 10), ("Pasted (2)", "b" * 10)]
+
+
+def test_paragraphs_that_fit_stay_together():
+    text = "\n\n".join(["a" * 5, "b" * 5, "c" * 5])
+    assert split_sections(text, max_chars=15) == [("", text)]
+
+
+def test_a_paragraph_longer_than_the_limit_is_never_cut():
+    assert split_sections("x" * 50, max_chars=15) == [("", "x" * 50)]
+
+
+def test_numbering_restarts_under_each_heading():
+    text = "\n\n".join(["# A", "a" * 10, "a" * 10, "# B", "b" * 10, "b" * 10])
+    assert [description for description, _ in split_sections(text, max_chars=15)] == \
+        ["A", "A (2)", "B", "B (2)"]
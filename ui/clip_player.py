@@ -1,14 +1,16 @@
 import sys
+from collections import OrderedDict
 
 from PyQt6.QtCore import Qt, QUrl, QTime, QObject, pyqtSignal
 from PyQt6.QtMultimedia import QMediaPlayer, QMediaMetaData, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QSlider, QListWidget, QFileDialog, QLabel,
-    QHBoxLayout, QSizePolicy
+    QHBoxLayout, QSizePolicy, QComboBox
 )
 
 from ui.clip_player_ui import PlayButton, PauseButton, StopButton, StartClipButton, EndClipButton, FileControlDecoration
+from editor.links import clip_key, reference_key
 
 
 class VideoClip(QObject):
@@ -36,7 +38,7 @@ class VideoClip(QObject):
         self.setTitle(title)
 
         if start is not None:
-            self.startClip(max(start, 0))
+            self.beginClip(max(start, 0))
         if end is not None:
             self.endClip(max(end, 0))
 
@@ -45,21 +47,21 @@ class VideoClip(QObject):
         if self.end < self.start:
             self.end = self.start
 
-        self.clip_begin.emit(self. start)
+        self.clip_begin.emit(self.start)
         if self.end == self.start:
-            self.zero_clip()
+            self.zero_clip.emit()
 
     def endClip(self, end: int):
         self.end = max(end, 0)
         if self.start >= self.end:
             self.start = self.end
             self.zero_clip.emit()
-        self.clip_end.emit()
+        self.clip_end.emit(self.end)
 
     def setTitle(self, title: str):
         if not title == "":
             self.title = title
-            self.title_set.emit()
+            self.title_set.emit(title)
 
     def getBounds(self) -> (int, int):
         return self.start, self.end
@@ -76,28 +78,39 @@ class VideoClip(QObject):
 class ReferenceVideo(QObject):
     clipChanged = pyqtSignal()
     mediaRefChanged = pyqtSignal()
+    media_error = pyqtSignal(str)
+    """ Emitted with a message when the reference fails to load or play """
 
-    def __init__(self):
+    def __init__(self, media: QMediaPlayer | None = None):
         super().__init__()
 
         self.filename: str | None = None
-        self.media = QMediaPlayer(None)
+        # An already loaded (warm) player can be handed in to skip the reload
+        self.media = media if media is not None else QMediaPlayer(None)
         self.media.errorChanged.connect(self.onMediaError)
         self.media.sourceChanged.connect(self.onMediaChanged)
         self.clips: dict[str, VideoClip] = {}
 
     def onMediaError(self) -> None:
-        raise InterruptedError(
-            "Reference video error: ".join(self.media.errorString())
-        )
+        # Raising from a slot would abort the application; report it instead
+        if self.media.error() == QMediaPlayer.Error.NoError: return
+        self.media_error.emit(f"Reference video error: {self.media.errorString()}")
 
     def onMediaChanged(self, mediaUrl: QUrl) -> None:
+        # The pool unloads a player by clearing its source; that is not a new video
+        if mediaUrl.isEmpty(): return
         self.newClip(0, self.media.duration(), "Entire Video")
-        print(mediaUrl.toString())
+
+    def release(self) -> None:
+        """Disconnects from the player, which lives on in the pool after this reference is dropped."""
+        self.media.errorChanged.disconnect(self.onMediaError)
+        self.media.sourceChanged.disconnect(self.onMediaChanged)
 
     def setVideoRef(self, filename: str) -> None:
         self.clips.clear()
-        self.media.setSource(QUrl.fromLocalFile(filename))
+        self.filename = filename
+        if self.media.source() != QUrl.fromLocalFile(filename):
+            self.media.setSource(QUrl.fromLocalFile(filename))
 
     def newClip(self, start: int, end: int, title: str | None) -> str | None:
         """ Creates a new VideoClip object with a given
@@ -107,7 +120,8 @@ class ReferenceVideo(QObject):
 
         clip = VideoClip(start, end, title)
 
-        clip_id = clip.objectName()
+        clip_id = clip_key(start, end)
+        clip.setObjectName(clip_id)
         self.clips[clip_id] = clip
 
         return clip_id
@@ -116,8 +130,97 @@ class ReferenceVideo(QObject):
         self.clips.pop(clipID)
 
 
+class MediaPlayerPool(QObject):
+    """ Bounded pool of media players keyed by source file, evicted least recently used first.
+        The keep_loaded most recent players stay loaded and paused; older ones are unloaded,
+        and every source keeps its playback position. """
+
+    def __init__(self, parent: QObject | None = None, capacity: int = 5, keep_loaded: int = 3):
+        super().__init__(parent)
+        self.capacity = max(capacity, 1)
+        self.keep_loaded = min(max(keep_loaded, 1), self.capacity)
+        self.players: OrderedDict[str, QMediaPlayer] = OrderedDict()
+        self.positions: dict[str, int] = {}
+        self.filenames: dict[str, str] = {}
+        # Players in use on screen; never unloaded or destroyed by trimming
+        self.pinned: set[str] = set()
+
+    def pin(self, filename: str) -> None:
+        self.pinned.add(reference_key(filename))
+
+    def unpin(self, filename: str) -> None:
+        self.pinned.discard(reference_key(filename))
+
+    def acquire(self, filename: str) -> QMediaPlayer:
+        """Returns the player for a file, loading it (at its last position) only if it is not warm."""
+        key = reference_key(filename)
+        self.filenames[key] = filename
+        player = self.players.pop(key, None)
+        if player is None:
+            player = QMediaPlayer(self)
+        self.players[key] = player
+
+        if player.source().isEmpty():
+            self._load(player, key)
+        self._trim()
+        return player
+
+    def prefetch(self, filename: str, position: int) -> QMediaPlayer:
+        """Warms up a player for a file and parks it, paused, at position."""
+        key = reference_key(filename)
+        self.positions[key] = position
+        player = self.acquire(filename)
+        if player.mediaStatus() in (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia):
+            player.setPosition(position)
+            player.pause()
+        return player
+
+    def park(self, filename: str) -> None:
+        """Pauses a file's player, keeping its position for the next acquire."""
+        key = reference_key(filename)
+        player = self.players.get(key, None)
+        if player is None: return
+        player.pause()
+        self.positions[key] = player.position()
+
+    def _load(self, player: QMediaPlayer, key: str) -> None:
+        def restore(status: QMediaPlayer.MediaStatus):
+            if status not in (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.InvalidMedia): return
+            # Connected once per load; a file that fails to load is not waited on again
+            player.mediaStatusChanged.disconnect(restore)
+            if status == QMediaPlayer.MediaStatus.InvalidMedia: return
+            player.setPosition(self.positions.get(key, 0))
+            # Pausing pre-rolls the pipeline to the first frame
+            player.pause()
+        player.mediaStatusChanged.connect(restore)
+        player.setSource(QUrl.fromLocalFile(self.filenames[key]))
+
+    def _trim(self) -> None:
+        # Players past capacity are destroyed, least recently used first
+        while len(self.players) > self.capacity:
+            key = next((key for key in self.players if key not in self.pinned), None)
+            if key is None: break
+            player = self.players.pop(key)
+            self._unload(key, player)
+            player.deleteLater()
+
+        # Players past keep_loaded give up their decoder but stay pooled
+        for index, (key, player) in enumerate(reversed(self.players.items())):
+            if index >= self.keep_loaded and key not in self.pinned and not player.source().isEmpty():
+                self._unload(key, player)
+
+    def _unload(self, key: str, player: QMediaPlayer) -> None:
+        if not player.source().isEmpty():
+            self.positions[key] = player.position()
+        player.stop()
+        player.setSource(QUrl())
+
+
 class VideoPlayer(QMainWindow):
-    def __init__(self):
+    clip_selected = pyqtSignal(str, str)
+    """ Emitted with the reference filename and clip id when a clip is picked from the list """
+
+    def __init__(self, pool: MediaPlayerPool | None = None):
         super().__init__()
 
         self.setWindowTitle("New Reference - Video")
@@ -131,6 +234,9 @@ class VideoPlayer(QMainWindow):
         self.audioOutput = QAudioOutput()
         self.refVideo: ReferenceVideo | None = None
         self.mediaPlayer: QMediaPlayer | None = None
+        self.pool = pool if pool is not None else MediaPlayerPool(self)
+        # Reference videos by source, reused while their pooled player lives
+        self.references: dict[str, ReferenceVideo] = {}
 
         self.playButton = PlayButton()
         self.playButton.clicked.connect(self.play_video)
@@ -153,6 +259,9 @@ class VideoPlayer(QMainWindow):
 
         self.importButton = QPushButton("Import Video")
         self.importButton.clicked.connect(self.import_video)
+        self.referenceBox = QComboBox()
+        self.referenceBox.setToolTip("Switch Reference")
+        self.referenceBox.activated.connect(self.switch_reference)
         spacer = FileControlDecoration()
         spacer.setMinimumWidth(400)
         self.exportButton = QPushButton("Export Clips")
@@ -175,6 +284,7 @@ class VideoPlayer(QMainWindow):
 
         fileControlLayout = QHBoxLayout()
         fileControlLayout.addWidget(self.importButton)
+        fileControlLayout.addWidget(self.referenceBox)
         fileControlLayout.addWidget(spacer)
         fileControlLayout.addWidget(self.exportButton)
 
@@ -196,16 +306,53 @@ class VideoPlayer(QMainWindow):
     def import_video(self):
         fileName, _ = QFileDialog.getOpenFileName(QFileDialog(), "Open Video File", "", "Video Files (*.mp4 *.avi *.mkv)")
         if fileName:
-            self.refVideo = ReferenceVideo()
-            self.refVideo.setVideoRef(fileName)
-            self.mediaPlayer = self.refVideo.media
-            self.mediaPlayer.setVideoOutput(self.videoWidget)
-            self.mediaPlayer.setAudioOutput(self.audioOutput)
-            self.videoWidget.show()
+            self.load_reference(fileName)
             self.play_video()
             # self.clips.append((0, self.mediaPlayer.duration()))
             # self.clipListWidget.addItem(f"Full Video: {self.format_time(0)} - {self.format_time(self.mediaPlayer.duration())}")
 
+    def load_reference(self, fileName: str, media: QMediaPlayer | None = None) -> None:
+        """Shows a reference video in its pooled player, leaving the previous one paused and loaded."""
+        if self.mediaPlayer is not None and self.refVideo is not None:
+            self.pool.park(self.refVideo.filename)
+            self.pool.unpin(self.refVideo.filename)
+            self.mediaPlayer.setVideoOutput(None)
+            self.mediaPlayer.setAudioOutput(None)
+
+        key = reference_key(fileName)
+        if media is None:
+            media = self.pool.acquire(fileName)
+        self.pool.pin(fileName)
+        self.refVideo = self.references.get(key, None)
+        if self.refVideo is None or self.refVideo.media is not media:
+            if self.refVideo is not None:
+                self.refVideo.release()
+            # One reference per pooled player, so each player is connected once
+            self.refVideo = ReferenceVideo(media)
+            self.refVideo.media_error.connect(self.statusBar().showMessage)
+            self.refVideo.setVideoRef(fileName)
+            self.references[key] = self.refVideo
+        # Drop references whose player the pool has let go of
+        for other_key in list(self.references):
+            if other_key not in self.pool.players or self.references[other_key].media is not self.pool.players[other_key]:
+                self.references.pop(other_key).release()
+
+        if self.referenceBox.findData(key) < 0:
+            self.referenceBox.addItem(QUrl.fromLocalFile(fileName).fileName(), key)
+        self.referenceBox.setCurrentIndex(self.referenceBox.findData(key))
+
+        self.mediaPlayer = self.refVideo.media
+        self.mediaPlayer.setVideoOutput(self.videoWidget)
+        self.mediaPlayer.setAudioOutput(self.audioOutput)
+        self.setWindowTitle(f"{QUrl.fromLocalFile(fileName).fileName()} - Video")
+        self.videoWidget.show()
+
+    def switch_reference(self, index: int) -> None:
+        key = self.referenceBox.itemData(index)
+        filename = self.pool.filenames.get(key, None)
+        if filename is not None:
+            self.load_reference(filename)
+
     def export_clips(self):
         pass
 
@@ -281,6 +428,8 @@ class VideoPlayer(QMainWindow):
             start, end = self.clips[selectedClip]
             self.mediaPlayer.setPosition(start)
             self.slider.setRange(start, end)
+            if self.refVideo is not None and self.refVideo.filename is not None:
+                self.clip_selected.emit(reference_key(self.refVideo.filename), clip_key(start, end))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+# ~/projects/contenta/ui/find_replace.py
+import re
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtWidgets import (
+    QDialog, QWidget, QFormLayout, QHBoxLayout, QLineEdit, QCheckBox, QLabel, QPushButton
+)
+
+from editor.cscr import CSCRTree
+from editor.find_replace import FindQuery, ReplacePlan, find_in_tree, plan_replace
+
+
+class ReplaceSignals(QObject):
+    finished = pyqtSignal(object, list)
+    """ Emitted with the plan and its (new text, count) results """
+    failed = pyqtSignal(str)
+
+
+class ReplaceWorker(QRunnable):
+    """ Computes a Replace All off the GUI thread; worker processes do the matching for large scripts """
+
+    def __init__(self, plan: ReplacePlan):
+        super().__init__()
+        self.plan = plan
+        self.signals = ReplaceSignals()
+
+    def run(self):
+        try:
+            results = self.plan.compute(jobs=None)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(self.plan, results)
+
+
+class FindReplaceDialog(QDialog):
+    """ Searches the whole script tree, including section headers, and replaces in one step """
+
+    search_started = pyqtSignal()
+    """ Emitted before the tree is read, so pending edits can be written into it first """
+
+    def __init__(self, parent: QWidget | None = None):
+        super().__init__(parent)
+        self.setWindowTitle("Find and Replace")
+        self.script: CSCRTree | None = None
+        # The Replace All being computed; its result is dropped if the script or query changes meanwhile
+        self.pending_plan: ReplacePlan | None = None
+
+        self.find_edit = QLineEdit()
+        self.replace_edit = QLineEdit()
+        self.regex_box = QCheckBox("Regular expression")
+        self.case_box = QCheckBox("Match case")
+        self.word_box = QCheckBox("Whole words")
+        self.headers_box = QCheckBox("Include section headers")
+        self.headers_box.setChecked(True)
+        self.preview_label = QLabel()
+        self.replace_button = QPushButton("Replace All")
+        self.replace_button.clicked.connect(self.replace_all)
+
+        options = QHBoxLayout()
+        for box in (self.regex_box, self.case_box, self.word_box, self.headers_box):
+            options.addWidget(box)
+        layout = QFormLayout(self)
+        layout.addRow("Find", self.find_edit)
+        layout.addRow("Replace", self.replace_edit)
+        layout.addRow(options)
+        layout.addRow(self.preview_label, self.replace_button)
+
+        # Match counts are refreshed once typing settles, not on every keystroke
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(200)
+        self.preview_timer.timeout.connect(self.update_preview)
+        self.find_edit.textChanged.connect(self.preview_timer.start)
+        for box in (self.regex_box, self.case_box, self.word_box, self.headers_box):
+            box.toggled.connect(self.preview_timer.start)
+
+    def set_script(self, script: CSCRTree | None) -> None:
+        self.script = script
+        self.pending_plan = None
+        self.preview_timer.start()
+
+    def query(self) -> FindQuery:
+        fields = ("content", "desc") if self.headers_box.isChecked() else ("content",)
+        return FindQuery(self.find_edit.text(), self.regex_box.isChecked(), self.case_box.isChecked(),
+                         self.word_box.isChecked(), fields)
+
+    def update_preview(self) -> None:
+        self.replace_button.setEnabled(False)
+        if self.script is None or self.find_edit.text() == "":
+            self.preview_label.setText("")
+            return
+
+        self.search_started.emit()
+        try:
+            # Runs on every keystroke: stay in-process rather than wait on worker start-up
+            preview = find_in_tree(self.script, self.query())
+        except re.error as e:
+            self.preview_label.setText(f"Invalid pattern: {e}")
+            return
+        self.preview_label.setText(preview.summary())
+        self.replace_button.setEnabled(preview.total > 0 and self.pending_plan is None)
+
+    def replace_all(self) -> None:
+        if self.script is None or self.pending_plan is not None: return
+        self.search_started.emit()
+        try:
+            plan = plan_replace(self.script, self.query(), self.replace_edit.text())
+        except re.error as e:
+            self.preview_label.setText(f"Invalid replacement: {e}")
+            return
+        self.pending_plan = plan
+        self.replace_button.setEnabled(False)
+        self.preview_label.setText("Replacing...")
+
+        worker = ReplaceWorker(plan)
+        worker.signals.finished.connect(self.apply_replace)
+        worker.signals.failed.connect(self.replace_failed)
+        QThreadPool.globalInstance().start(worker)
+
+    def apply_replace(self, plan: ReplacePlan, results: list[tuple[str, int]]) -> None:
+        if plan is not self.pending_plan: return
+        self.pending_plan = None
+        count = plan.apply(self.script, results)
+        self.preview_label.setText(f"Replaced {count}")
+
+    def replace_failed(self, message: str) -> None:
+        self.pending_plan = None
+        self.preview_label.setText(f"Replace failed: {message}")
@@ -0,0 +1,36 @@
+# ~/projects/contenta/ui/memory_report.py
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QFontDatabase
+from PyQt6.QtWidgets import QDialog, QWidget, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton
+
+from editor.memory import MemoryReport
+
+
+class MemoryReportDialog(QDialog):
+    """ Shows the latest memory report and the history of earlier ones """
+
+    refresh_requested = pyqtSignal()
+
+    def __init__(self, parent: QWidget | None = None):
+        super().__init__(parent)
+        self.setWindowTitle("Memory Report")
+        self.resize(640, 480)
+
+        self.report_view = QPlainTextEdit()
+        self.report_view.setReadOnly(True)
+        self.report_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh_requested)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(refresh_button)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.report_view)
+        layout.addLayout(buttons)
+
+    def show_report(self, report: MemoryReport, history: str) -> None:
+        text = report.summary()
+        if history:
+            text += f"\n\nHistory:\n{history}"
+        self.report_view.setPlainText(text)
@@ -14,18 +14,25 @@ class FileMenu(QMenuBar):
 
         file_menu: QMenu = self.addMenu("File")
         self.build_action(file_menu, "New")
+        self.build_action(file_menu, "New from Template...")
         self.build_action(file_menu, None)
         self.build_action(file_menu, "Save")
         self.build_action(file_menu, "Load")
+        self.build_action(file_menu, "Export...")
         self.build_action(file_menu, None)
         self.build_action(file_menu, "Exit")
 
         file_menu: QMenu = self.addMenu("Script")
         self.build_action(file_menu, "Change Title")
+        self.build_action(file_menu, "Find and Replace...")
+        self.build_action(file_menu, "Read-Through")
         self.build_action(file_menu, None)
         self.build_action(file_menu, "Manage Media/References")
 
         file_menu: QMenu = self.addMenu("Editor")
+        self.build_action(file_menu, "Split Large Pastes")
+        self.build_action(file_menu, "Memory Report...")
+        self.build_action(file_menu, None)
         self.build_action(file_menu, "Settings")
 
     def build_action(self, menu: QMenu, text: str | None) -> None: